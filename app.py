@@ -1,16 +1,28 @@
 import sys
 import ctypes
+import multiprocessing
 
-from PySide6.QtGui import QIcon, QAction
-from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
-
-from src.windows.main import MainWindow
-from src.config import window_icon_path
+from src.startup import startup_profile
 
 if __name__ == "__main__":
+    # the pose detection process of frozen builds starts from this entry point
+    multiprocessing.freeze_support()
+
+    # imported here, the spawned pose detection process runs this module again
+    # as __mp_main__ and does not need Qt or the windows
+    with startup_profile.measure_import("PySide6"):
+        from PySide6.QtCore import QTimer
+        from PySide6.QtGui import QIcon, QAction
+        from PySide6.QtWidgets import QApplication, QSystemTrayIcon, QMenu
+
+    with startup_profile.measure_import("src"):
+        from src.windows.main import MainWindow
+        from src.config import window_icon_path
+
     # Set the appid so the icon is shown in the taskbar
-    appid = "company.product.subproduct.version"  # arbitrary string
-    ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(appid)
+    if sys.platform == "win32":
+        appid = "company.product.subproduct.version"  # arbitrary string
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(appid)
 
     app = QApplication([])
 
@@ -36,4 +48,11 @@ if __name__ == "__main__":
 
     w = MainWindow()
     w.show()
+
+    # after the window is painted
+    def first_window_shown():
+        startup_profile.mark("first window")
+        print(startup_profile)
+
+    QTimer.singleShot(0, first_window_shown)
     sys.exit(app.exec())
@@ -1,28 +1,62 @@
+import math
 import cv2
 import numpy as np
-import mediapipe as mp
 import traceback
 from copy import deepcopy
 from .utils import (
-    get_landmark_coordinates,
-    calculate_angle,
+    landmarks_to_array,
+    calculate_angles,
+    calculate_slopes,
     log_landmark,
     log_angle,
-    calculate_slope,
     compare_nums,
 )
 from .events import Events
-from .config import DRIVING_UP_AREA
+from .smoothing import OneEuroFilter
+from .config import DRIVING_UP_AREA, IMAGE_HEIGHT, IMAGE_WIDTH
 from .movements import (
     Movements,
     get_separated_movements_by_name,
     default_movements_config,
 )
 
-mp_drawing = mp.solutions.drawing_utils
-mp_drawing_styles = mp.solutions.drawing_styles
-mp_pose = mp.solutions.pose
-
+# All landmarks of the pose model in the order of mediapipe PoseLandmark, mediapipe
+# is not imported here as it takes long to load
+POSE_LANDMARK_NAMES = [
+    "NOSE",
+    "LEFT_EYE_INNER",
+    "LEFT_EYE",
+    "LEFT_EYE_OUTER",
+    "RIGHT_EYE_INNER",
+    "RIGHT_EYE",
+    "RIGHT_EYE_OUTER",
+    "LEFT_EAR",
+    "RIGHT_EAR",
+    "MOUTH_LEFT",
+    "MOUTH_RIGHT",
+    "LEFT_SHOULDER",
+    "RIGHT_SHOULDER",
+    "LEFT_ELBOW",
+    "RIGHT_ELBOW",
+    "LEFT_WRIST",
+    "RIGHT_WRIST",
+    "LEFT_PINKY",
+    "RIGHT_PINKY",
+    "LEFT_INDEX",
+    "RIGHT_INDEX",
+    "LEFT_THUMB",
+    "RIGHT_THUMB",
+    "LEFT_HIP",
+    "RIGHT_HIP",
+    "LEFT_KNEE",
+    "RIGHT_KNEE",
+    "LEFT_ANKLE",
+    "RIGHT_ANKLE",
+    "LEFT_HEEL",
+    "RIGHT_HEEL",
+    "LEFT_FOOT_INDEX",
+    "RIGHT_FOOT_INDEX",
+]
 
 LANDMARK_NAMES = [
     "NOSE",
@@ -88,6 +122,35 @@ SLOPES = [
 ]
 
 
+# Number of landmarks returned by the pose model
+LANDMARKS_COUNT = len(POSE_LANDMARK_NAMES)
+
+LANDMARK_INDEXES = np.array(
+    [POSE_LANDMARK_NAMES.index(name) for name in LANDMARK_NAMES]
+)
+
+LANDMARK_TYPES = ("pose", "world")
+
+
+def landmark_indexes(items, size):
+    """
+    Precompute (landmark_type, landmark index) arrays for each position of the
+    landmarks tuple of ANGLES or SLOPES.
+    """
+    types = np.array(
+        [LANDMARK_TYPES.index(item.get("landmark_type", "world")) for item in items]
+    )
+    indexes = tuple(
+        np.array([POSE_LANDMARK_NAMES.index(item["landmarks"][i]) for item in items])
+        for i in range(size)
+    )
+    return types, indexes
+
+
+ANGLE_TYPES, ANGLE_INDEXES = landmark_indexes(ANGLES, 3)
+SLOPE_TYPES, SLOPE_INDEXES = landmark_indexes(SLOPES, 2)
+
+
 def angle_key_name(name):
     return f"ANGLE_{name}"
 
@@ -99,10 +162,29 @@ def slope_key_name(name):
 class BodyState:
     def __init__(self, body_config, events_config):
         self.draw_angles = body_config["draw_angles"]
+        self.record_landmarks = body_config.get("record_landmarks", False)
+        self.smooth_landmarks = body_config.get("smooth_landmarks", False)
+        self.landmarks_filter = OneEuroFilter(
+            min_cutoff=body_config.get("smoothing_min_cutoff", 1.0),
+            beta=body_config.get("smoothing_beta", 10.0),
+        )
 
         self.movements = Movements(movements_config=deepcopy(default_movements_config))
         self.events = Events(**events_config)
 
+        # landmarks of the latest frame, (x, y, z, visibility) rows for pose and world,
+        # smoothed if smooth_landmarks is enabled
+        self.landmarks = np.zeros((len(LANDMARK_TYPES), LANDMARKS_COUNT, 4))
+        self.pose_landmarks = self.landmarks[0]
+        self.world_landmarks = self.landmarks[1]
+        # landmarks as detected, e.g. for recordings
+        self.raw_landmarks = np.zeros_like(self.landmarks)
+        self.raw_pose_landmarks = self.raw_landmarks[0]
+        self.raw_world_landmarks = self.raw_landmarks[1]
+        self.visibility = np.zeros(LANDMARKS_COUNT, dtype=bool)
+        self.angles = np.full(len(ANGLES), np.nan)
+        self.slopes = np.full(len(SLOPES), np.nan)
+
         self.state = {
             # "NOSE": { pose: (x, y, z, v), world: (x, y, z, v), visibility: bool },
             # "ANGLE_NAME": angle,
@@ -118,22 +200,64 @@ class BodyState:
     def __getitem__(self, key):
         return getattr(self, key)
 
-    def calculate(self, image, results, timestamp):
+    # Returns True if a body was detected in the results
+    def calculate(self, results, timestamp):
+        if not results.pose_landmarks or not results.pose_world_landmarks:
+            return self.calculate_landmarks(None, None, timestamp)
+
         try:
-            if not results.pose_landmarks or not results.pose_world_landmarks:
-                return
+            self.update_state(results, timestamp)
+
+            self.detect_movement(timestamp)
+
+        except Exception:
+            print(traceback.format_exc())
 
-            self.update_state(results)
+        return True
+
+    # Same as calculate but from (33, 4) pose and world landmark arrays, None if
+    # no body was detected, e.g. replayed from a recording
+    def calculate_landmarks(self, pose_landmarks, world_landmarks, timestamp):
+        if pose_landmarks is None or world_landmarks is None:
+            # the smoothing starts over when the body is detected again
+            self.landmarks_filter.reset()
+            return False
+
+        try:
+            self.raw_pose_landmarks[:] = pose_landmarks
+            self.raw_world_landmarks[:] = world_landmarks
+
+            self.update_landmarks(timestamp)
+            self.update_features()
 
             self.detect_movement(timestamp)
 
+        except Exception:
+            print(traceback.format_exc())
+
+        return True
+
+    # Draw overlays of the latest state on the image
+    def draw(self, image):
+        try:
             if self.mode == "Driving":
+                # the area is in preview pixels, the image has the capture size
+                scale = np.divide(image.shape[1::-1], (IMAGE_WIDTH, IMAGE_HEIGHT))
                 cv2.rectangle(
                     image,
-                    (DRIVING_UP_AREA["x"], DRIVING_UP_AREA["y"]),
-                    (
-                        DRIVING_UP_AREA["x"] + DRIVING_UP_AREA["width"],
-                        DRIVING_UP_AREA["y"] + DRIVING_UP_AREA["height"],
+                    tuple(
+                        np.multiply(
+                            (DRIVING_UP_AREA["x"], DRIVING_UP_AREA["y"]), scale
+                        ).astype(int)
+                    ),
+                    tuple(
+                        np.multiply(
+                            (
+                                DRIVING_UP_AREA["x"] + DRIVING_UP_AREA["width"],
+                                DRIVING_UP_AREA["y"] + DRIVING_UP_AREA["height"],
+                            ),
+                            scale,
+                        ).astype(int)
                     ),
                     (0, 255, 0),
                     2,
@@ -146,8 +270,13 @@ class BodyState:
             print(traceback.format_exc())
 
     def init_state(self):
-        for name in LANDMARK_NAMES:
-            self.state[name] = None
+        # landmark entries are views into the landmark arrays, only visibility changes
+        for name, index in zip(LANDMARK_NAMES, LANDMARK_INDEXES):
+            self.state[name] = {
+                "visibility": False,
+                "pose": self.pose_landmarks[index],
+                "world": self.world_landmarks[index],
+            }
 
         for angle in ANGLES:
             self.state[angle_key_name(angle["name"])] = None
@@ -155,59 +284,49 @@ class BodyState:
         for slope in SLOPES:
             self.state[slope_key_name(slope["name"])] = None
 
-    def update_state(self, results):
-        pose_landmarks = results.pose_landmarks.landmark
-        world_landmarks = results.pose_world_landmarks.landmark
+    def update_state(self, results, timestamp):
+        landmarks_to_array(results.pose_landmarks.landmark, self.raw_pose_landmarks)
+        landmarks_to_array(
+            results.pose_world_landmarks.landmark, self.raw_world_landmarks
+        )
 
-        # Get coordinates
-        for name in LANDMARK_NAMES:
-            self.state[name] = get_landmark_coordinates(
-                pose_landmarks, world_landmarks, getattr(mp_pose.PoseLandmark, name)
-            )
+        self.update_landmarks(timestamp)
+        self.update_features()
 
-        # Calculate angles
-        for angle in ANGLES:
-            name = angle["name"]
-            landmarks = angle["landmarks"]
-            landmark_type = angle.get("landmark_type", "world")
-
-            a = (
-                self.state[landmarks[0]][landmark_type]
-                if self.state[landmarks[0]]["visibility"]
-                else None
+    # Smooth the raw landmarks of all types at once
+    def update_landmarks(self, timestamp):
+        if self.smooth_landmarks:
+            self.landmarks_filter.filter(
+                self.raw_landmarks, timestamp, out=self.landmarks
             )
-            b = (
-                self.state[landmarks[1]][landmark_type]
-                if self.state[landmarks[1]]["visibility"]
-                else None
+        else:
+            self.landmarks[:] = self.raw_landmarks
+
+    # Calculate visibility, angles and slopes from the landmark arrays
+    def update_features(self):
+        np.less_equal(
+            np.abs(self.pose_landmarks[:, :2]).max(axis=1), 1, out=self.visibility
+        )
+
+        for name, index in zip(LANDMARK_NAMES, LANDMARK_INDEXES):
+            self.state[name]["visibility"] = bool(self.visibility[index])
+
+        self.angles = calculate_angles(
+            self.landmarks, self.visibility, ANGLE_TYPES, *ANGLE_INDEXES
+        )
+        for angle, value in zip(ANGLES, self.angles.tolist()):
+            self.state[angle_key_name(angle["name"])] = (
+                None if math.isnan(value) else value
             )
-            c = (
-                self.state[landmarks[2]][landmark_type]
-                if self.state[landmarks[2]]["visibility"]
-                else None
-            )
-
-            self.state[angle_key_name(name)] = calculate_angle(a, b, c)
 
-        # Calculate slopes
-        for slope in SLOPES:
-            name = slope["name"]
-            landmarks = slope["landmarks"]
-            landmark_type = slope.get("landmark_type", "world")
-
-            a = (
-                self.state[landmarks[0]][landmark_type]
-                if self.state[landmarks[0]]["visibility"]
-                else None
-            )
-            b = (
-                self.state[landmarks[1]][landmark_type]
-                if self.state[landmarks[1]]["visibility"]
-                else None
+        self.slopes = calculate_slopes(
+            self.landmarks, self.visibility, SLOPE_TYPES, *SLOPE_INDEXES
+        )
+        for slope, value in zip(SLOPES, self.slopes.tolist()):
+            self.state[slope_key_name(slope["name"])] = (
+                None if math.isnan(value) else value
             )
 
-            self.state[slope_key_name(name)] = calculate_slope(a, b)
-
     def detect_movement(self, timestamp):
         # ignore the movements by checking command key mappings
         ignored_movement_names = []
@@ -226,36 +345,29 @@ class BodyState:
                 continue
 
             for i, checkpoint in enumerate(checkpoints):
-                condition = checkpoint["condition"]
-                state = checkpoint.get("state", False)
-                active_duration = checkpoint.get("active_duration", 0)
-
-                if condition(self.state):
-                    if not state:
+                # checkpoint states persist across frames
+                if checkpoint["condition"](self.state):
+                    if not checkpoint.get("state", False):
                         checkpoint["state"] = True
                         checkpoint["active_time"] = timestamp
 
-                        # if all checkpoints are passed, add the movement to the pipeline
-                        if i == len(checkpoints) - 1 and all(
-                            [
-                                checkpoint.get("state", False)
-                                for checkpoint in checkpoints
-                            ]
-                        ):
-                            self.events.add(
-                                command_name=name,
-                                command_type=movement_type,
-                                timestamp=timestamp,
-                            )
-
-                            # ignore the movements
-                            ignored_movements = get_separated_movements_by_name(name)
-                            if ignored_movements:
-                                ignored_movement_names += ignored_movements["group"]
-
-                if (
-                    not condition(self.state)
-                    and timestamp - checkpoint.get("active_time", 0) > active_duration
+                    # if all checkpoints are passed, add the movement to the pipeline
+                    if i == len(checkpoints) - 1 and all(
+                        [checkpoint.get("state", False) for checkpoint in checkpoints]
+                    ):
+                        self.events.add(
+                            command_name=name,
+                            command_type=movement_type,
+                            timestamp=timestamp,
+                        )
+
+                        # ignore the movements
+                        ignored_movements = get_separated_movements_by_name(name)
+                        if ignored_movements:
+                            ignored_movement_names += ignored_movements["group"]
+
+                elif timestamp - checkpoint.get("active_time", 0) > checkpoint.get(
+                    "active_duration", 0
                 ):
                     checkpoint["state"] = False
 
@@ -272,7 +384,7 @@ class BodyState:
             cv2.putText(
                 image,
                 str(round(angle_value, None)),
-                tuple(np.multiply(landmark[:2], [640, 480]).astype(int)),
+                tuple(np.multiply(landmark[:2], image.shape[1::-1]).astype(int)),
                 cv2.FONT_HERSHEY_SIMPLEX,
                 0.5,
                 (255, 255, 255),
@@ -280,24 +392,28 @@ class BodyState:
                 cv2.LINE_AA,
             )
 
-    def get_logs(self):
-        logs = ""
+    # Returns (name, value) pairs of the logs, names are the same for every call
+    def get_log_fields(self):
+        fields = []
         for name in LANDMARK_NAMES:
             landmark = self.state[name]
-            logs += f"{name}: {log_landmark(landmark['pose'])}\n"
+            fields.append((name, log_landmark(landmark["pose"])))
 
         for angle in ANGLES:
             angle_value = self.state[angle_key_name(angle["name"])]
-            logs += f"{angle_key_name(angle['name'])}: {log_angle(angle_value)}\n"
+            fields.append((angle_key_name(angle["name"]), log_angle(angle_value)))
 
         for slope in SLOPES:
             slope_value = self.state[slope_key_name(slope["name"])]
-            logs += f"{slope_key_name(slope['name'])}: {log_angle(slope_value)}\n"
+            fields.append((slope_key_name(slope["name"]), log_angle(slope_value)))
+
+        fields.append(("Keyboard", "YES" if self.events.keyboard_enabled else "NO"))
+        fields += self.events.get_log_fields()
 
-        return f"""{logs}
-Keyboard: {'YES' if self.events.keyboard_enabled else 'NO'}
-{self.events}
-"""
+        return fields
+
+    def get_logs(self):
+        return "\n".join(f"{name}: {value}" for name, value in self.get_log_fields())
 
     def __str__(self):
         return self.get_logs()
@@ -1,15 +1,79 @@
+import heapq
+import itertools
+import threading
+import time
+import traceback
 from datetime import datetime
-from pynput.keyboard import Controller
-from threading import Timer
-from .utils.keyboard import str_to_keyboard
+from functools import partial
+from .utils.keyboard import pynput_keyboard, str_to_keyboard
 
 
-class CommandProcessor:
+class KeyScheduler:
+    """
+    One thread calling the scheduled key releases at their deadlines, shared by
+    the CommandProcessors instead of a Timer thread per command.
+    """
+
     def __init__(self):
-        self.keyboard = Controller()
+        self.condition = threading.Condition()
+        self.heap = []  # (deadline, sequence, callback)
+        self.sequence = itertools.count()
+        self.thread = None
+
+    # Call callback after delay seconds
+    def schedule(self, delay: float, callback):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+            entry = (time.monotonic() + delay, next(self.sequence), callback)
+            heapq.heappush(self.heap, entry)
+
+            # wake up the thread if the new entry is the next one
+            if self.heap[0] is entry:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.heap:
+                        self.condition.wait()
+                        continue
+                    delay = self.heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+
+                _, _, callback = heapq.heappop(self.heap)
+
+            try:
+                callback()
+            except Exception:
+                print(traceback.format_exc())
+
+
+class CommandProcessor:
+    def __init__(self, key_scheduler: KeyScheduler, on_press=None):
+        self.keyboard_controller = None
         self.commands = []
         self.pressing_key = None
-        self.pressing_timer = None
+
+        # a release is only done for the latest scheduled one, older ones are outdated
+        self.key_scheduler = key_scheduler
+        self.release_id = 0
+        self.lock = threading.Lock()
+
+        # optional callback(timestamp) with the timestamp of the event of a pressed key
+        self.on_press = on_press
+
+    # The controller is created when the first key is pressed
+    @property
+    def keyboard(self):
+        if self.keyboard_controller is None:
+            self.keyboard_controller = pynput_keyboard().Controller()
+        return self.keyboard_controller
 
     def release_previous_key(self):
         if self.pressing_key:
@@ -25,6 +89,11 @@ class CommandProcessor:
 
             self.pressing_key = None
 
+    def release_scheduled_key(self, release_id):
+        with self.lock:
+            if release_id == self.release_id:
+                self.release_previous_key()
+
     # Clear log commands
     def limit_commands(self):
         if len(self.commands) > 900:
@@ -36,6 +105,7 @@ class CommandProcessor:
         keyboard_enabled: bool,
         command_key_mappings: dict,
         pressing_timer_interval: float,
+        timestamp: float = None,
     ):
         self.limit_commands()
 
@@ -51,37 +121,43 @@ class CommandProcessor:
                 if not key and not modifier:
                     return
 
-                # get current pressing key
-                previous_key = None
-                previous_key_modifier = None
-                if self.pressing_key:
-                    previous_key = self.pressing_key.get("key", None)
-                    previous_key_modifier = self.pressing_key.get("modifier", None)
-
-                # clear old timer
-                if self.pressing_timer and self.pressing_timer.is_alive():
-                    # print("cancel timer")
-                    self.pressing_timer.cancel()
-
-                # new action
-                if previous_key != key or previous_key_modifier != modifier:
-                    self.release_previous_key()
-                    if key:
-                        print("pressing", key, type(key))
-                        self.keyboard.press(key)
-                    if modifier:
-                        print("pressing", modifier, type(modifier))
-                        self.keyboard.press(modifier)
-
-                if key or modifier:
-                    # create new timer
-                    self.pressing_timer = Timer(
-                        pressing_timer_interval,
-                        self.release_previous_key,
+                with self.lock:
+                    self.press_command_key(
+                        key, modifier, pressing_timer_interval, now, timestamp
                     )
-                    self.pressing_timer.start()
 
-                    self.pressing_key = dict(key=key, modifier=modifier, time=now)
+    def press_command_key(
+        self, key, modifier, pressing_timer_interval, now, timestamp=None
+    ):
+        # get current pressing key
+        previous_key = None
+        previous_key_modifier = None
+        if self.pressing_key:
+            previous_key = self.pressing_key.get("key", None)
+            previous_key_modifier = self.pressing_key.get("modifier", None)
+
+        # new action
+        if previous_key != key or previous_key_modifier != modifier:
+            self.release_previous_key()
+            if key:
+                print("pressing", key, type(key))
+                self.keyboard.press(key)
+            if modifier:
+                print("pressing", modifier, type(modifier))
+                self.keyboard.press(modifier)
+
+            if self.on_press and timestamp is not None:
+                self.on_press(timestamp)
+
+        if key or modifier:
+            # schedule the release, replaces the previous one
+            self.release_id += 1
+            self.key_scheduler.schedule(
+                pressing_timer_interval,
+                partial(self.release_scheduled_key, self.release_id),
+            )
+
+            self.pressing_key = dict(key=key, modifier=modifier, time=now)
 
     def __str__(self):
         commands_list = list(map(lambda c: c["command"], self.commands))
@@ -1,8 +1,8 @@
-import mediapipe as mp
+import atexit
 import json
 import os
-
-BaseOptions = mp.tasks.BaseOptions
+import threading
+import time
 
 window_title = "MotionMap"
 # Window dimensions: x, y, width, height
@@ -10,13 +10,23 @@ window_geometry = (100, 100, 660, 680)
 
 window_icon_path = "src/assets/icon.png"
 
+# Refresh interval of the logs window
+logs_update_interval = 200  # ms
+
+# Size of the camera preview, the capture size is set in the camera config
 IMAGE_WIDTH = 640
 IMAGE_HEIGHT = 480
 
+# In preview pixels
 DRIVING_UP_AREA = dict(x=250, y=290, width=140, height=140)
 
 auto_start_camera = False
 
+# Build the pose model and run it on blank frames in the background at launch,
+# so the first camera frame runs at steady state latency
+warm_up_pose_model = True
+warm_up_frames = 3
+
 body_modes = [
     "Action",
     "Driving",
@@ -30,11 +40,47 @@ default_mp_config = dict(
     enable_segmentation=False,
 )
 
+# Config for camera capture and preview
+default_camera_config = dict(
+    # capture settings requested from the camera driver, empty or 0 for the driver default
+    capture_fourcc="MJPG",  # pixel format, MJPG allows higher frame rates on USB cameras
+    capture_width=640,
+    capture_height=480,
+    capture_fps=30,
+    capture_buffer_size=1,  # frames buffered by the driver, more adds latency
+    # frames are downscaled to this width before the pose detection, 0 to keep the capture size
+    inference_width=640,
+    # run the pose detection on every n-th frame, landmarks of the frames in between
+    # are extrapolated
+    inference_interval=1,
+    # run mediapipe in a separate process, frames are shared in memory
+    inference_process=False,
+    preview_fps=30,  # max frame rate of the camera preview
+    segmentation_mask_interval=1,  # update the background mask every n preview frames
+    camera_ports=[],  # working camera ports found at the latest launch
+    # switch the model complexity to keep pose.process within the frame budget
+    adaptive_model_complexity=False,
+    frame_budget=33,  # ms
+    # run the pose detection on a crop around the body of the previous frame
+    roi_cropping=False,
+)
+
+# Camera ports tested at launch, in parallel
+max_camera_ports = 10
+camera_port_timeout = 5  # seconds
+
 # Config for body processor
 default_body_config = dict(
     draw_angles=True,  # Show calculated angles on camera
+    record_landmarks=False,  # Save detected landmarks of each camera session
+    smooth_landmarks=False,  # One Euro filter on the landmarks, see src/smoothing.py
+    smoothing_min_cutoff=1.0,  # Hz, lower is smoother for still landmarks
+    smoothing_beta=10.0,  # higher has less lag for fast movements
 )
 
+# Directory of the landmark recordings, see src/recording.py
+recordings_dir = "recordings"
+
 default_pressing_timer_interval = dict(
     click=0.3,  # key pressed interval
     hold=1.0,  # key pressed interval for walking commands
@@ -111,19 +157,87 @@ default_events_config = dict(
 )
 
 config_file_path = "config.local.json"
+startup_profile_path = "startup_profile.local.jsonl"
+config_save_delay = 0.5  # seconds without changes before writing the config file
+
+
+class ConfigWriter:
+    """
+    Writes the latest config data in a background thread once no change came in
+    for save_delay seconds. Files are replaced atomically, a crash while writing
+    keeps the previous file.
+    """
+
+    def __init__(self, path: str, save_delay=config_save_delay):
+        self.path = path
+        self.save_delay = save_delay
+
+        self.condition = threading.Condition()
+        self.file_lock = threading.Lock()
+        self.data = None  # pending data
+        self.changed_time = 0
+        self.thread = None
+
+        # write pending changes on exit
+        atexit.register(self.flush)
+
+    def write(self, data: str):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+            self.data = data
+            self.changed_time = time.monotonic()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.data is None:
+                    self.condition.wait()
+
+                delay = self.changed_time + self.save_delay - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+            self.flush()
+
+    # Write the pending data now
+    def flush(self):
+        with self.file_lock:
+            with self.condition:
+                data = self.data
+                self.data = None
+
+            if data is not None:
+                self.write_file(data)
+
+    def write_file(self, data: str):
+        print("save config")
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
 
 
 class AppConfig:
 
     def __init__(self):
         self.mp_config = default_mp_config
+        self.camera_config = default_camera_config
         self.body_config = default_body_config
         self.events_config = default_events_config
         self.controls_list = default_controls_list
 
+        self.writer = ConfigWriter(config_file_path)
+
         # create file if not exists
         if not os.path.exists(config_file_path):
-            self.save_config()
+            self.writer.write_file(self.dump_config())
 
         self.load_config()
 
@@ -132,24 +246,31 @@ class AppConfig:
         with open(config_file_path, "r") as f:
             config = json.load(f)
 
-            self.mp_config = config["mp_config"]
-            self.body_config = config["body_config"]
-            self.events_config = config["events_config"]
+            # fill in new default values missing from older config files
+            self.mp_config = {**default_mp_config, **config["mp_config"]}
+            self.camera_config = {
+                **default_camera_config,
+                **config.get("camera_config", {}),
+            }
+            self.body_config = {**default_body_config, **config["body_config"]}
+            self.events_config = {**default_events_config, **config["events_config"]}
             self.controls_list = config["controls_list"]
 
+    def dump_config(self):
+        return json.dumps(
+            {
+                "mp_config": self.mp_config,
+                "camera_config": self.camera_config,
+                "body_config": self.body_config,
+                "events_config": self.events_config,
+                "controls_list": self.controls_list,
+            },
+            indent=4,
+        )
+
+    # Changes are written in the background, frequent saves are coalesced
     def save_config(self):
-        print("save config")
-        with open(config_file_path, "w") as f:
-            json.dump(
-                {
-                    "mp_config": self.mp_config,
-                    "body_config": self.body_config,
-                    "events_config": self.events_config,
-                    "controls_list": self.controls_list,
-                },
-                f,
-                indent=4,
-            )
+        self.writer.write(self.dump_config())
 
     def get_config_fields(self):
         fields = [
@@ -166,6 +287,30 @@ class AppConfig:
                 input="checkbox",
                 description="Show calculated angles on camera",
             ),
+            dict(
+                name="Preview FPS",
+                key="preview_fps",
+                type="camera",
+                input="slider",
+                min=1,
+                max=60,
+                value=self.camera_config["preview_fps"],
+                description="Max frame rate of the camera preview. The preview is not drawn while the window is hidden or minimized, detection always runs at full rate.",
+            ),
+            dict(
+                name="Smooth landmarks",
+                key="smooth_landmarks",
+                type="body",
+                input="checkbox",
+                description="Filter the jitter of the detected landmarks before detecting movements, fast movements are not delayed. Helps with the Lite model complexity.",
+            ),
+            dict(
+                name="Record landmarks",
+                key="record_landmarks",
+                type="body",
+                input="checkbox",
+                description=f"Save the detected landmarks of each camera session to the '{recordings_dir}' directory, they can be replayed with 'python -m src.replay'. Applied when the camera starts.",
+            ),
             dict(
                 name="Advanced settings (require restart the camera to apply, hover for more info)",
                 input="label",
@@ -207,5 +352,46 @@ class AppConfig:
                 value=self.mp_config["model_complexity"],
                 description="The model complexity to be used for pose detection: 0: Lite 1: Full 2: Heavy",
             ),
+            dict(
+                name="Crop to the body",
+                key="roi_cropping",
+                type="camera",
+                input="checkbox",
+                description="Run the pose detection on the area around the body detected in the previous frame instead of the whole camera frame, the whole frame is used again when the body is lost. Faster and more precise when the body is small in the frame.",
+            ),
+            dict(
+                name="Run pose detection in a separate process",
+                key="inference_process",
+                type="camera",
+                input="checkbox",
+                description="Avoid frame time spikes from UI activity by running the pose detection in its own process. Frames are passed through shared memory.",
+            ),
+            dict(
+                name="Pose detection interval (frames)",
+                key="inference_interval",
+                type="camera",
+                input="slider",
+                min=1,
+                max=5,
+                value=self.camera_config["inference_interval"],
+                description="Run the pose detection on every n-th camera frame. The landmarks of the frames in between are extrapolated from the latest detections, so movements are still checked on every frame.",
+            ),
+            dict(
+                name="Adaptive model complexity",
+                key="adaptive_model_complexity",
+                type="camera",
+                input="checkbox",
+                description="Lower the model complexity when the pose detection is slower than the frame budget, and raise it again up to the model complexity above when there is enough headroom.",
+            ),
+            dict(
+                name="Frame budget (ms)",
+                key="frame_budget",
+                type="camera",
+                input="slider",
+                min=10,
+                max=100,
+                value=self.camera_config["frame_budget"],
+                description="Target pose detection time per frame of the adaptive model complexity, 33 ms for 30 fps.",
+            ),
         ]
         return fields
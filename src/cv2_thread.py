@@ -1,120 +1,76 @@
-import sys
-import traceback
-import cv2
-import numpy as np
 from PySide6.QtCore import Qt, QThread, Signal
 from PySide6.QtGui import QImage
-import mediapipe as mp
 from .body import BodyState
 from .config import IMAGE_HEIGHT, IMAGE_WIDTH, AppConfig
-
-mp_drawing = mp.solutions.drawing_utils
-mp_drawing_styles = mp.solutions.drawing_styles
-mp_pose = mp.solutions.pose
-
-BG_COLOR = (192, 192, 192)  # gray
+from .pipeline import CameraPipeline
 
 
 class Cv2Thread(QThread):
     update_status = Signal(dict)
     update_frame = Signal(QImage)
-    update_state = Signal(dict)
 
+    # The pipeline is held, not mixed in: PySide6 passes the __init__ call of
+    # QThread on to the other base classes
     def __init__(
         self,
         parent,
         app_config: AppConfig,
     ):
         QThread.__init__(self, parent)
-        self.status = False
-        self.cap = None
-        self.body = BodyState(app_config.body_config, app_config.events_config)
-        self.mp_config = app_config.mp_config
-        self.camera_port = 0
+        self.pipeline = QtPipeline(self, app_config)
 
     def toggle(self):
-        self.status = not self.status
-        if self.status:
+        self.pipeline.status = not self.pipeline.status
+        if self.pipeline.status:
             self.start()
 
     def run(self):
-        print("run mediapipe", self.mp_config)
-        self.update_status.emit(dict(loading=True))
-        self.cap = cv2.VideoCapture(self.camera_port)
-
-        with mp_pose.Pose(**self.mp_config) as pose:
-            while self.cap.isOpened() and self.status:
-                self.update_status.emit(dict(loading=False))
-                success, image = self.cap.read()
-                if not success:
-                    print("Ignoring empty camera frame.")
-                    # If loading a video, use 'break' instead of 'continue'.
-                    continue
-
-                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
-
-                # To improve performance, optionally mark the image as not writeable to
-                # pass by reference.
-                # Recolor image to RGB
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                image.flags.writeable = False
-
-                # Make detection
-                results = pose.process(image)
-
-                # Recolor back to BGR
-                image.flags.writeable = True
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-
-                if (
-                    self.mp_config["enable_segmentation"]
-                    and results.segmentation_mask is not None
-                ):
-                    try:
-                        # Draw selfie segmentation on the background image.
-                        # To improve segmentation around boundaries, consider applying a joint
-                        # bilateral filter to "results.segmentation_mask" with "image".
-                        condition = (
-                            np.stack((results.segmentation_mask,) * 3, axis=-1) > 0.1
-                        )
-                        # The background can be customized.
-                        #   a) Load an image (with the same width and height of the input image) to
-                        #      be the background, e.g., bg_image = cv2.imread('/path/to/image/file')
-                        #   b) Blur the input image by applying image filtering, e.g.,
-                        #      bg_image = cv2.GaussianBlur(image,(55,55),0)
-                        bg_image = cv2.GaussianBlur(image, (55, 55), 0)
-                        if bg_image is None:
-                            bg_image = np.zeros(image.shape, dtype=np.uint8)
-                            bg_image[:] = BG_COLOR
-                        image = np.where(condition, image, bg_image)
-                    except Exception:
-                        print(traceback.format_exc())
-
-                # Draw landmark annotation on the image.
-                mp_drawing.draw_landmarks(
-                    image,
-                    results.pose_landmarks,
-                    mp_pose.POSE_CONNECTIONS,
-                    landmark_drawing_spec=mp_drawing_styles.get_default_pose_landmarks_style(),
-                )
-
-                self.body.calculate(image, results, timestamp)
-
-                # Reading the image in RGB to display it
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-                # Creating and scaling QImage
-                h, w, ch = image.shape
-                image = QImage(image.data, w, h, ch * w, QImage.Format_RGB888)
-                image = image.scaled(IMAGE_WIDTH, IMAGE_HEIGHT, Qt.KeepAspectRatio)
-
-                # Emit signal
-                self.update_frame.emit(image)
-                self.update_state.emit(dict(body=self.body))
-
-                if cv2.waitKey(5) & 0xFF == 27:
-                    break
-
-        print("stop camera")
-        self.cap.release()
-        self.update_status.emit(dict(loading=False))
+        self.pipeline.frame_shown()
+        self.pipeline.run()
+
+
+class QtPipeline(CameraPipeline):
+    """
+    CameraPipeline of a Cv2Thread, the hooks emit the signals of the thread.
+    """
+
+    def __init__(self, thread: Cv2Thread, app_config: AppConfig):
+        super().__init__(
+            body=BodyState(app_config.body_config, app_config.events_config),
+            mp_config=app_config.mp_config,
+            camera_config=app_config.camera_config,
+        )
+        self.thread = thread
+
+        # set by the UI, frames are not drawn while the preview is not visible
+        self.preview_visible = True
+
+        # the frame emitted to the UI and not shown yet
+        self.frame_pending = False
+        self.frame_buffer = None
+
+    def on_status(self, status: dict):
+        self.thread.update_status.emit(status)
+
+    # Only one frame is sent to the UI at a time, see frame_shown
+    def wants_frame(self):
+        return self.preview_visible and not self.frame_pending
+
+    def on_frame(self, image):
+        # Wrap the RGB buffer without copying, it is kept alive until the UI shows it
+        with self.timings.measure("qimage"):
+            h, w, ch = image.shape
+            qimage = QImage(image.data, w, h, ch * w, QImage.Format_RGB888)
+            if (w, h) != (IMAGE_WIDTH, IMAGE_HEIGHT):
+                qimage = qimage.scaled(IMAGE_WIDTH, IMAGE_HEIGHT, Qt.KeepAspectRatio)
+
+        self.frame_pending = True
+        self.frame_buffer = image
+
+        # Emit signal
+        self.thread.update_frame.emit(qimage)
+
+    # Called by the UI when the emitted frame is shown
+    def frame_shown(self):
+        self.frame_buffer = None
+        self.frame_pending = False
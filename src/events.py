@@ -1,6 +1,11 @@
-from .command import CommandProcessor
+import time
+from collections import deque
+from .command import CommandProcessor, KeyScheduler
 from .movements import get_separated_movements_by_name
 
+HISTORY_DURATION = 10000  # ms
+HISTORY_MAX_LENGTH = 1000
+
 
 class Events:
     def __init__(
@@ -13,11 +18,25 @@ class Events:
         self.command_key_mappings = command_key_mappings
         self.pressing_timer_interval = pressing_timer_interval
 
-        self.history = []
+        # latest events, only kept for HISTORY_DURATION
+        self.history = deque(maxlen=HISTORY_MAX_LENGTH)
+        # timestamp of the latest event of each group of separated movements
+        self.groups_last_timestamp = dict()
+
+        # optional callback(command_name, command_type, timestamp) for accepted events
+        self.on_add = None
+        # optional callback(latency) when a key is pressed, latency in ms from the
+        # timestamp of the event, timestamps must be time.monotonic() in ms
+        self.on_press = None
+
+        # releases the pressed keys of all command processors
+        self.key_scheduler = KeyScheduler()
 
         self.commands_map: dict[str, CommandProcessor] = dict()
         for key in self.pressing_timer_interval.keys():
-            self.commands_map[key] = CommandProcessor()
+            self.commands_map[key] = CommandProcessor(
+                self.key_scheduler, on_press=self.key_pressed
+            )
 
     def __setitem__(self, key, value):
         setattr(self, key, value)
@@ -27,27 +46,32 @@ class Events:
 
     # Add command to pipeline
     def add(self, command_name, command_type, timestamp):
-        # check in history and ignore if related movements are already added during the configured duration
+        # ignore if related movements are already added during the configured duration
         ignored_movements = get_separated_movements_by_name(command_name)
         if ignored_movements:
-            for event in self.history:
-                event_name = event["name"]
-                if event_name in ignored_movements["group"] and timestamp - event[
-                    "timestamp"
-                ] < ignored_movements.get("duration", 0):
-                    # print("ignore", command_name, command_type)
-                    return
+            group = ignored_movements["group"]
+            last_timestamp = self.groups_last_timestamp.get(group)
+            if last_timestamp is not None and timestamp - last_timestamp < (
+                ignored_movements.get("duration", 0)
+            ):
+                # print("ignore", command_name, command_type)
+                return
+            self.groups_last_timestamp[group] = timestamp
 
         # only keeps latest events in history from 10 seconds
-        self.history = [
-            event for event in self.history if timestamp - event["timestamp"] < 10000
-        ]
+        while self.history and timestamp - self.history[0]["timestamp"] >= (
+            HISTORY_DURATION
+        ):
+            self.history.popleft()
         self.history.append(
             {"name": command_name, "timestamp": timestamp, "type": command_type}
         )
 
         # print("add command", command_name, command_type)
 
+        if self.on_add:
+            self.on_add(command_name, command_type, timestamp)
+
         pressing_timer_interval = self.pressing_timer_interval[command_type]
 
         self.commands_map[command_type].add_command(
@@ -55,11 +79,19 @@ class Events:
             self.keyboard_enabled,
             self.command_key_mappings,
             pressing_timer_interval,
+            timestamp,
         )
 
+    def key_pressed(self, timestamp):
+        if self.on_press:
+            self.on_press(time.monotonic() * 1000 - timestamp)
+
+    def get_log_fields(self):
+        return [(k, f"({len(v.commands)}) {v}") for k, v in self.commands_map.items()]
+
     def __str__(self):
         result = ""
-        for k, v in self.commands_map.items():
-            result += f"{k} ({len(v.commands)}): {v}\n"
+        for k, v in self.get_log_fields():
+            result += f"{k} {v}\n"
 
         return result
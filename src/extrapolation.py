@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class LandmarksExtrapolator:
+    """
+    Estimates the landmarks of the frames between two pose detections from the
+    velocity of each landmark between the latest two detections.
+    """
+
+    def __init__(self, max_gap=500):
+        self.max_gap = max_gap  # ms between detections to still use the velocity
+
+        self.landmarks = None
+        self.velocity = None  # per ms
+        self.timestamp = None  # of the latest detection
+        self.extrapolated = False  # since the latest detection
+
+    def reset(self):
+        self.timestamp = None
+
+    # Add the (2, 33, 4) landmarks of a detection. Returns the drift of the
+    # extrapolation to them if frames were extrapolated since the previous
+    # detection: the mean distance of the pose landmarks, in frame size units
+    def update(self, landmarks: np.ndarray, timestamp: float):
+        drift = None
+        if self.timestamp is None or timestamp - self.timestamp > self.max_gap:
+            self.landmarks = np.array(landmarks, dtype=float)
+            self.velocity = np.zeros_like(self.landmarks)
+        else:
+            dt = timestamp - self.timestamp
+            if self.extrapolated:
+                predicted = self.landmarks[0, :, :2] + self.velocity[0, :, :2] * dt
+                drift = float(
+                    np.linalg.norm(predicted - landmarks[0, :, :2], axis=1).mean()
+                )
+
+            if dt > 0:
+                np.subtract(landmarks, self.landmarks, out=self.velocity)
+                self.velocity /= dt
+                # visibility is kept
+                self.velocity[..., 3] = 0
+            self.landmarks[:] = landmarks
+
+        self.timestamp = timestamp
+        self.extrapolated = False
+        return drift
+
+    # Write the landmarks at timestamp to out
+    def extrapolate(self, timestamp: float, out: np.ndarray):
+        np.multiply(self.velocity, timestamp - self.timestamp, out=out)
+        out += self.landmarks
+        self.extrapolated = True
+        return out
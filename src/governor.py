@@ -0,0 +1,78 @@
+import time
+import numpy as np
+from collections import deque
+
+
+class ComplexityGovernor:
+    """
+    Adapts the pose model complexity (0: Lite 1: Full 2: Heavy) to keep the median
+    pose.process latency within a frame budget.
+
+    The complexity steps down when the median latency of the latest frames is over
+    the budget and steps up when it is under up_ratio of the budget. Latencies are
+    collected again after each switch, and a complexity that was too slow is only
+    tried again after retry_interval seconds, doubled each time it is too slow
+    again, so it does not flap.
+    """
+
+    def __init__(
+        self,
+        budget: float,
+        max_complexity=2,
+        window=30,
+        up_ratio=0.5,
+        retry_interval=30,
+    ):
+        self.budget = budget  # seconds
+        self.max_complexity = max_complexity
+        self.complexity = max_complexity
+        self.up_ratio = up_ratio
+        self.retry_interval = retry_interval
+
+        self.durations = deque(maxlen=window)
+        # (time, retry interval) of the latest step down from each complexity
+        self.too_slow = dict()
+
+    # The complexity set by the user is the highest one used
+    def set_max_complexity(self, max_complexity: int):
+        self.max_complexity = max_complexity
+        if self.complexity > max_complexity:
+            self.switch(max_complexity)
+
+    # Add the latency of a pose.process call, returns the complexity to use
+    def add(self, duration: float):
+        self.durations.append(duration)
+        if len(self.durations) < self.durations.maxlen:
+            return self.complexity
+
+        latency = float(np.median(self.durations))
+        now = time.monotonic()
+        if latency > self.budget and self.complexity > 0:
+            _, interval = self.too_slow.get(
+                self.complexity, (None, self.retry_interval / 2)
+            )
+            self.too_slow[self.complexity] = (now, interval * 2)
+            self.switch(self.complexity - 1, latency)
+        elif (
+            latency < self.budget * self.up_ratio
+            and self.complexity < self.max_complexity
+            and self.can_retry(self.complexity + 1, now)
+        ):
+            self.switch(self.complexity + 1, latency)
+
+        return self.complexity
+
+    def can_retry(self, complexity: int, now: float):
+        if complexity not in self.too_slow:
+            return True
+        too_slow_time, interval = self.too_slow[complexity]
+        return now - too_slow_time >= interval
+
+    def switch(self, complexity: int, latency: float = None):
+        if latency is not None:
+            print(
+                f"model complexity {self.complexity} -> {complexity}, "
+                f"median latency {latency * 1000:.1f} ms, budget {self.budget * 1000:.0f} ms"
+            )
+        self.complexity = complexity
+        self.durations.clear()
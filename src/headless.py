@@ -0,0 +1,71 @@
+import argparse
+import threading
+import time
+from .body import BodyState
+from .config import AppConfig
+from .pipeline import CameraPipeline
+
+
+class HeadlessPipeline(CameraPipeline):
+    """
+    Camera pipeline without GUI and preview rendering.
+    """
+
+    def on_status(self, status: dict):
+        if status["loading"]:
+            print("loading camera...")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the camera -> pose -> movements -> keys pipeline without GUI, "
+        "using the settings of config.local.json."
+    )
+    parser.add_argument("--camera", type=int, default=0, help="camera port")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=10,
+        help="print stage latencies every this many seconds, 0 to disable",
+    )
+    args = parser.parse_args()
+
+    app_config = AppConfig()
+
+    pipeline = HeadlessPipeline(
+        body=BodyState(app_config.body_config, app_config.events_config),
+        mp_config=app_config.mp_config,
+        camera_config=app_config.camera_config,
+        preview=False,
+    )
+    pipeline.camera_port = args.camera
+    pipeline.status = True
+
+    thread = threading.Thread(target=pipeline.run)
+    thread.start()
+
+    start = time.monotonic()
+    last_stats = start
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+            now = time.monotonic()
+
+            if args.stats_interval and now - last_stats >= args.stats_interval:
+                last_stats = now
+                print(pipeline.timings)
+
+            if args.duration and now - start >= args.duration:
+                break
+    except KeyboardInterrupt:
+        pass
+
+    pipeline.status = False
+    thread.join()
+    pipeline.close_pose()
+    print(pipeline.timings)
+
+
+if __name__ == "__main__":
+    main()
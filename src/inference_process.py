@@ -0,0 +1,269 @@
+import atexit
+import collections
+import functools
+import multiprocessing
+import traceback
+import cv2
+import numpy as np
+from multiprocessing import shared_memory
+from .body import LANDMARKS_COUNT
+
+# Largest frame of a slot, bigger frames are downscaled before the pose detection
+MAX_FRAME_WIDTH = 1920
+MAX_FRAME_HEIGHT = 1080
+
+# Result of a frame slot, the segmentation mask has its own shared memory
+RESULT_DTYPE = np.dtype(
+    [
+        ("frame_shape", "<i4", (2,)),  # height, width, written by the app
+        ("detected", "?"),
+        ("has_mask", "?"),
+        ("pose_landmarks", "<f4", (LANDMARKS_COUNT, 4)),
+        ("world_landmarks", "<f4", (LANDMARKS_COUNT, 4)),
+    ],
+    align=True,
+)
+
+
+class PoseArrays(
+    collections.namedtuple("PoseArrays", ["landmarks", "segmentation_mask"])
+):
+    """
+    Results of PoseProcess: (2, 33, 4) pose and world landmarks, None if no body
+    was detected, and the segmentation mask. The landmark protobufs of mediapipe
+    results are only built when used, e.g. to draw the preview.
+    """
+
+    @functools.cached_property
+    def pose_landmarks(self):
+        if self.landmarks is None:
+            return None
+        return to_landmark_list(self.landmarks[0])
+
+    @functools.cached_property
+    def pose_world_landmarks(self):
+        if self.landmarks is None:
+            return None
+        return to_landmark_list(self.landmarks[1], world=True)
+
+
+class FrameSlots:
+    """
+    Ring of preallocated frame, mask and result slots in shared memory. The app
+    creates them and the worker process attaches to them by name.
+    """
+
+    def __init__(self, slots: int, names=None):
+        self.slots = slots
+        sizes = (
+            slots * MAX_FRAME_HEIGHT * MAX_FRAME_WIDTH * 3,
+            slots * MAX_FRAME_HEIGHT * MAX_FRAME_WIDTH * 4,
+            slots * RESULT_DTYPE.itemsize,
+        )
+        self.owner = names is None
+        if self.owner:
+            self.memories = [
+                shared_memory.SharedMemory(create=True, size=size) for size in sizes
+            ]
+        else:
+            self.memories = [shared_memory.SharedMemory(name=name) for name in names]
+
+        # slots are flat, so the frame of any size in a slot is contiguous
+        frames, masks, results = self.memories
+        self.frames = np.ndarray(
+            (slots, MAX_FRAME_HEIGHT * MAX_FRAME_WIDTH * 3), np.uint8, frames.buf
+        )
+        self.masks = np.ndarray(
+            (slots, MAX_FRAME_HEIGHT * MAX_FRAME_WIDTH), np.float32, masks.buf
+        )
+        self.results = np.ndarray((slots,), RESULT_DTYPE, results.buf)
+
+    @property
+    def names(self):
+        return [memory.name for memory in self.memories]
+
+    # Views of the frame and the mask of a slot, with the frame shape of the slot
+    def frame(self, slot: int):
+        height, width = self.results["frame_shape"][slot]
+        return self.frames[slot, : height * width * 3].reshape(height, width, 3)
+
+    def mask(self, slot: int):
+        height, width = self.results["frame_shape"][slot]
+        return self.masks[slot, : height * width].reshape(height, width)
+
+    def close(self):
+        # the arrays must be released before the memory
+        self.frames = self.masks = self.results = None
+        for memory in self.memories:
+            memory.close()
+            if self.owner:
+                memory.unlink()
+
+
+class PoseProcess:
+    """
+    Mediapipe Pose running in a separate process, so the pose detection does not
+    share the GIL with the UI. It has the same process() and close() as Pose.
+
+    Frames are written to a ring of shared memory slots and the landmarks come back
+    as arrays in the result of the slot, only slot indexes are sent over the pipe.
+    process() waits for the result, so one frame is processed at a time and a
+    single slot is used by default.
+    """
+
+    def __init__(self, slots=1, start_timeout=60, **mp_config):
+        self.slots = FrameSlots(slots)
+        self.next_slot = 0
+
+        context = multiprocessing.get_context("spawn")
+        self.conn, worker_conn = context.Pipe()
+        self.worker = context.Process(
+            target=run_worker,
+            args=(worker_conn, self.slots.names, slots, mp_config),
+            daemon=True,
+        )
+        self.worker.start()
+        worker_conn.close()
+
+        # stop the worker and free the shared memory on exit
+        self.closed = False
+        atexit.register(self.close)
+
+        # wait for the model to be built in the worker
+        try:
+            started = self.conn.poll(start_timeout) and self.conn.recv()
+        except (EOFError, OSError):
+            started = False
+        if not started:
+            self.close()
+            raise RuntimeError("pose process failed to start")
+
+    # image: RGB frame, returns PoseArrays
+    def process(self, image: np.ndarray):
+        height, width = image.shape[:2]
+        if width > MAX_FRAME_WIDTH or height > MAX_FRAME_HEIGHT:
+            # landmarks are normalized, the mask is scaled by the preview
+            scale = min(MAX_FRAME_WIDTH / width, MAX_FRAME_HEIGHT / height)
+            width, height = int(width * scale), int(height * scale)
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.slots.slots
+
+        self.slots.results["frame_shape"][slot] = (height, width)
+        self.slots.frame(slot)[:] = image
+        try:
+            self.conn.send(slot)
+            while not self.conn.poll(1):
+                if not self.worker.is_alive():
+                    raise EOFError
+            self.conn.recv()
+        except (EOFError, OSError):
+            # a new worker is started by the next CameraPipeline.get_pose()
+            self.close()
+            raise RuntimeError("pose process stopped") from None
+
+        return self.read_results(slot)
+
+    # The results are copied, the slot is written again by the next frames
+    def read_results(self, slot: int):
+        results = self.slots.results
+        if not results["detected"][slot]:
+            return PoseArrays(None, self.read_mask(slot))
+
+        landmarks = np.stack(
+            (results["pose_landmarks"][slot], results["world_landmarks"][slot])
+        )
+        return PoseArrays(landmarks, self.read_mask(slot))
+
+    def read_mask(self, slot: int):
+        if not self.slots.results["has_mask"][slot]:
+            return None
+        return self.slots.mask(slot).copy()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+
+        if self.worker.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.worker.join(5)
+            if self.worker.is_alive():
+                self.worker.terminate()
+        self.conn.close()
+        self.slots.close()
+
+
+# Landmark protobuf list of a (33, 4) array, as in mediapipe results
+def to_landmark_list(landmarks: np.ndarray, world=False):
+    from mediapipe.framework.formats import landmark_pb2
+
+    if world:
+        return landmark_pb2.LandmarkList(
+            landmark=[
+                landmark_pb2.Landmark(x=x, y=y, z=z, visibility=v)
+                for x, y, z, v in landmarks.tolist()
+            ]
+        )
+    return landmark_pb2.NormalizedLandmarkList(
+        landmark=[
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=v)
+            for x, y, z, v in landmarks.tolist()
+        ]
+    )
+
+
+# Entry point of the worker process
+def run_worker(conn, names: list, slots: int, mp_config: dict):
+    import mediapipe as mp
+    from .utils import landmarks_to_array
+
+    frame_slots = FrameSlots(slots, names)
+    try:
+        pose = mp.solutions.pose.Pose(**mp_config)
+    except Exception:
+        print(traceback.format_exc())
+        conn.send(False)
+        frame_slots.close()
+        return
+    conn.send(True)
+
+    try:
+        while True:
+            slot = conn.recv()
+            if slot is None:
+                break
+
+            image = frame_slots.frame(slot)
+            image.flags.writeable = False
+            results = pose.process(image)
+
+            # fields are indexed first to write to the shared memory
+            result = frame_slots.results
+            detected = bool(results.pose_landmarks and results.pose_world_landmarks)
+            result["detected"][slot] = detected
+            if detected:
+                landmarks_to_array(
+                    results.pose_landmarks.landmark, result["pose_landmarks"][slot]
+                )
+                landmarks_to_array(
+                    results.pose_world_landmarks.landmark,
+                    result["world_landmarks"][slot],
+                )
+
+            mask = getattr(results, "segmentation_mask", None)
+            result["has_mask"][slot] = mask is not None
+            if mask is not None:
+                frame_slots.mask(slot)[:] = mask
+
+            conn.send(slot)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pose.close()
+        frame_slots.close()
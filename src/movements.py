@@ -57,10 +57,47 @@ class Movements:
     def __init__(self, movements_config: dict):
         self.movements_config = movements_config
 
+        self.current_list = self.compile_list()
+
     def update_config(self, key, value):
+        if self.movements_config.get(key) == value:
+            return
         self.movements_config[key] = value
 
+        # keep the checkpoint states of the running movements
+        previous_list = self.current_list
+        self.current_list = self.compile_list()
+        for previous, movement in zip(previous_list, self.current_list):
+            for previous_checkpoint, checkpoint in zip(
+                previous["checkpoints"], movement["checkpoints"]
+            ):
+                for key in ("state", "active_time"):
+                    if key in previous_checkpoint:
+                        checkpoint[key] = previous_checkpoint[key]
+
     def get_current_list(self):
+        return self.current_list
+
+    # Build the movements with the thresholds bound into the conditions,
+    # only needed again when the config changes
+    def compile_list(self):
+        config = self.movements_config
+        default_checkpoint_active_duration = config[
+            "DEFAULT_CHECKPOINT_ACTIVE_DURATION"
+        ]
+        elbow_cross_max_angle = config["ELBOW_CROSS_MAX_ANGLE"]
+        face_tilt_slope_max_angle = config["FACE_TILT_SLOPE_MAX_ANGLE"]
+        leg_kick_knee_max_angle = config["LEG_KICK_KNEE_MAX_ANGLE"]
+        leg_up_knee_max_angle = config["LEG_UP_KNEE_MAX_ANGLE"]
+        punch_elbow_min_angle = config["PUNCH_ELBOW_MIN_ANGLE"]
+        punch_elbow_shoulders_max_angle = config["PUNCH_ELBOW_SHOULDERS_MAX_ANGLE"]
+        punch_shoulder_max_angle = config["PUNCH_SHOULDER_MAX_ANGLE"]
+        punch_shoulder_min_angle = config["PUNCH_SHOULDER_MIN_ANGLE"]
+        squat_knee_max_angle = config["SQUAT_KNEE_MAX_ANGLE"]
+        straight_elbow_max_angle = config["STRAIGHT_ELBOW_MAX_ANGLE"]
+        up_shoulders_max_angle = config["UP_SHOULDERS_MAX_ANGLE"]
+        walk_knee_max_angle = config["WALK_KNEE_MAX_ANGLE"]
+
         movements = [
             # arm movements
             {
@@ -95,12 +132,12 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_LEFT_ELBOW"],
-                            self.movements_config["ELBOW_CROSS_MAX_ANGLE"],
+                            elbow_cross_max_angle,
                             "lt",
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_ELBOW"],
-                            self.movements_config["ELBOW_CROSS_MAX_ANGLE"],
+                            elbow_cross_max_angle,
                             "lt",
                         ),
                     },
@@ -117,9 +154,7 @@ class Movements:
                             state["NOSE"]["pose"][1],
                             "lt",
                         ),
-                        "active_duration": self.movements_config[
-                            "DEFAULT_CHECKPOINT_ACTIVE_DURATION"
-                        ],
+                        "active_duration": default_checkpoint_active_duration,
                     },
                     {
                         "condition": lambda state: compare_nums(
@@ -141,9 +176,7 @@ class Movements:
                             state["NOSE"]["pose"][1],
                             "lt",
                         ),
-                        "active_duration": self.movements_config[
-                            "DEFAULT_CHECKPOINT_ACTIVE_DURATION"
-                        ],
+                        "active_duration": default_checkpoint_active_duration,
                     },
                     {
                         "condition": lambda state: compare_nums(
@@ -195,17 +228,17 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_LEFT_ELBOW"],
-                            self.movements_config["PUNCH_ELBOW_MIN_ANGLE"],
+                            punch_elbow_min_angle,
                             "gt",
                         )
                         and in_range(
                             state["ANGLE_LEFT_SHOULDER"],
-                            self.movements_config["PUNCH_SHOULDER_MIN_ANGLE"],
-                            self.movements_config["PUNCH_SHOULDER_MAX_ANGLE"],
+                            punch_shoulder_min_angle,
+                            punch_shoulder_max_angle,
                         )
                         and compare_nums(
                             state["ANGLE_LEFT_ELBOW_SHOULDERS"],
-                            self.movements_config["PUNCH_ELBOW_SHOULDERS_MAX_ANGLE"],
+                            punch_elbow_shoulders_max_angle,
                             "lt",
                         ),
                     },
@@ -224,17 +257,17 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_ELBOW"],
-                            self.movements_config["PUNCH_ELBOW_MIN_ANGLE"],
+                            punch_elbow_min_angle,
                             "gt",
                         )
                         and in_range(
                             state["ANGLE_RIGHT_SHOULDER"],
-                            self.movements_config["PUNCH_SHOULDER_MIN_ANGLE"],
-                            self.movements_config["PUNCH_SHOULDER_MAX_ANGLE"],
+                            punch_shoulder_min_angle,
+                            punch_shoulder_max_angle,
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_ELBOW_SHOULDERS"],
-                            self.movements_config["PUNCH_ELBOW_SHOULDERS_MAX_ANGLE"],
+                            punch_elbow_shoulders_max_angle,
                             "lt",
                         )
                     },
@@ -249,7 +282,7 @@ class Movements:
                     {
                         "condition": lambda state: compare_nums(
                             state["ANGLE_LEFT_KNEE"],
-                            self.movements_config["SQUAT_KNEE_MAX_ANGLE"],
+                            squat_knee_max_angle,
                             "lt",
                         )
                         and compare_nums(
@@ -259,7 +292,7 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_KNEE"],
-                            self.movements_config["SQUAT_KNEE_MAX_ANGLE"],
+                            squat_knee_max_angle,
                             "lt",
                         )
                         and compare_nums(
@@ -283,7 +316,7 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_LEFT_KNEE"],
-                            self.movements_config["LEG_UP_KNEE_MAX_ANGLE"],
+                            leg_up_knee_max_angle,
                             "lt",
                         ),
                     },
@@ -302,7 +335,7 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_KNEE"],
-                            self.movements_config["LEG_UP_KNEE_MAX_ANGLE"],
+                            leg_up_knee_max_angle,
                             "lt",
                         ),
                     },
@@ -321,7 +354,7 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_LEFT_KNEE"],
-                            self.movements_config["LEG_KICK_KNEE_MAX_ANGLE"],
+                            leg_kick_knee_max_angle,
                             "gt",
                         ),
                     },
@@ -340,7 +373,7 @@ class Movements:
                         )
                         and compare_nums(
                             state["ANGLE_RIGHT_KNEE"],
-                            self.movements_config["LEG_KICK_KNEE_MAX_ANGLE"],
+                            leg_kick_knee_max_angle,
                             "gt",
                         ),
                     },
@@ -354,27 +387,27 @@ class Movements:
                 "checkpoints": [
                     {
                         "condition": lambda state: is_walking(
-                            state, self.movements_config["WALK_KNEE_MAX_ANGLE"]
+                            state, walk_knee_max_angle
                         )
                         and is_arm_up(
                             state,
                             "left",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         )
                         and is_arm_up(
                             state,
                             "right",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         )
                         and is_arm_straight(
                             state,
                             "left",
-                            self.movements_config["STRAIGHT_ELBOW_MAX_ANGLE"],
+                            straight_elbow_max_angle,
                         )
                         and is_arm_straight(
                             state,
                             "right",
-                            self.movements_config["STRAIGHT_ELBOW_MAX_ANGLE"],
+                            straight_elbow_max_angle,
                         ),
                     },
                 ],
@@ -386,22 +419,22 @@ class Movements:
                 "checkpoints": [
                     {
                         "condition": lambda state: is_walking(
-                            state, self.movements_config["WALK_KNEE_MAX_ANGLE"]
+                            state, walk_knee_max_angle
                         )
                         and is_arm_up(
                             state,
                             "left",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         )
                         and is_arm_straight(
                             state,
                             "left",
-                            self.movements_config["STRAIGHT_ELBOW_MAX_ANGLE"],
+                            straight_elbow_max_angle,
                         )
                         and not is_arm_up(
                             state,
                             "right",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         ),
                     },
                 ],
@@ -413,22 +446,22 @@ class Movements:
                 "checkpoints": [
                     {
                         "condition": lambda state: is_walking(
-                            state, self.movements_config["WALK_KNEE_MAX_ANGLE"]
+                            state, walk_knee_max_angle
                         )
                         and is_arm_up(
                             state,
                             "right",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         )
                         and is_arm_straight(
                             state,
                             "right",
-                            self.movements_config["STRAIGHT_ELBOW_MAX_ANGLE"],
+                            straight_elbow_max_angle,
                         )
                         and not is_arm_up(
                             state,
                             "left",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         ),
                     },
                 ],
@@ -440,17 +473,17 @@ class Movements:
                 "checkpoints": [
                     {
                         "condition": lambda state: is_walking(
-                            state, self.movements_config["WALK_KNEE_MAX_ANGLE"]
+                            state, walk_knee_max_angle
                         )
                         and not is_arm_up(
                             state,
                             "left",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         )
                         and not is_arm_up(
                             state,
                             "right",
-                            self.movements_config["UP_SHOULDERS_MAX_ANGLE"],
+                            up_shoulders_max_angle,
                         ),
                     },
                 ],
@@ -464,7 +497,7 @@ class Movements:
                     {
                         "condition": lambda state: compare_nums(
                             state["SLOPE_EYES"],
-                            self.movements_config["FACE_TILT_SLOPE_MAX_ANGLE"],
+                            face_tilt_slope_max_angle,
                             "gt",
                         ),
                     },
@@ -478,7 +511,7 @@ class Movements:
                     {
                         "condition": lambda state: compare_nums(
                             state["SLOPE_EYES"],
-                            -self.movements_config["FACE_TILT_SLOPE_MAX_ANGLE"],
+                            -face_tilt_slope_max_angle,
                             "lt",
                         ),
                     },
@@ -525,8 +558,12 @@ SEPARATED_MOVEMENTS_NAMES = (
 )
 
 
+SEPARATED_MOVEMENTS_BY_NAME = {
+    name: movements
+    for movements in SEPARATED_MOVEMENTS_NAMES
+    for name in movements["group"]
+}
+
+
 def get_separated_movements_by_name(name):
-    for movements in SEPARATED_MOVEMENTS_NAMES:
-        if name in movements["group"]:
-            return movements
-    return None
+    return SEPARATED_MOVEMENTS_BY_NAME.get(name)
@@ -0,0 +1,668 @@
+import time
+import dataclasses
+import threading
+import traceback
+import functools
+import cv2
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from .body import BodyState
+from .extrapolation import LandmarksExtrapolator
+from .governor import ComplexityGovernor
+from .inference_process import PoseArrays, PoseProcess
+from .roi import RegionOfInterest
+from .segmentation import BackgroundBlur
+from .config import startup_profile_path, warm_up_frames
+from .recording import LandmarksRecorder
+from .startup import startup_profile
+from .utils.keyboard import pynput_keyboard
+
+
+# mediapipe takes long to load, it is only imported when the pipeline starts
+@functools.cache
+def mp_solutions():
+    with startup_profile.measure_import("mediapipe"):
+        import mediapipe as mp
+
+    return mp.solutions
+
+
+# The drawing styles of mediapipe are BGR, convert them for drawing on RGB images
+def rgb_drawing_styles(styles: dict):
+    return {
+        key: dataclasses.replace(spec, color=spec.color[::-1])
+        for key, spec in styles.items()
+    }
+
+
+class LatestQueue:
+    """
+    Single slot queue between pipeline stages. A new item replaces the pending
+    one, so a slow consumer always gets the latest frame and the producer never
+    blocks.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.item = None
+        self.has_item = False
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.has_item:
+                self.dropped += 1
+            self.item = item
+            self.has_item = True
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Wait for the next item. Returns None on timeout or when the queue is closed.
+        """
+        with self.condition:
+            if not self.has_item and not self.closed:
+                self.condition.wait(timeout)
+            if not self.has_item:
+                return None
+            item = self.item
+            self.item = None
+            self.has_item = False
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class StageTimings:
+    """
+    Rolling latency percentiles of the pipeline stages and frame rates of the loops.
+    """
+
+    percentiles = (50, 95, 99)
+
+    def __init__(self, size=300):
+        self.size = size
+        self.durations: dict[str, deque] = dict()
+        self.ticks: dict[str, deque] = dict()
+        # other measured values than durations, e.g. errors
+        self.values: dict[str, deque] = dict()
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, duration: float):
+        durations = self.durations.get(stage)
+        if durations is None:
+            durations = self.durations[stage] = deque(maxlen=self.size)
+        durations.append(duration)
+
+    def add_value(self, name: str, value: float):
+        values = self.values.get(name)
+        if values is None:
+            values = self.values[name] = deque(maxlen=self.size)
+        values.append(value)
+
+    # Count a frame of a loop for its frame rate
+    def tick(self, loop: str):
+        ticks = self.ticks.get(loop)
+        if ticks is None:
+            ticks = self.ticks[loop] = deque(maxlen=self.size)
+        ticks.append(time.perf_counter())
+
+    def fps(self, loop: str):
+        ticks = list(self.ticks.get(loop, ()))
+        if len(ticks) < 2 or ticks[-1] == ticks[0]:
+            return 0
+        return (len(ticks) - 1) / (ticks[-1] - ticks[0])
+
+    # Returns {stage: (p50, p95, p99)} in ms
+    def get_percentiles(self):
+        result = dict()
+        for stage, durations in list(self.durations.items()):
+            values = list(durations)
+            if values:
+                result[stage] = tuple(np.percentile(values, self.percentiles) * 1000)
+        return result
+
+    # Returns {name: (p50, p95, p99)} of the values
+    def get_value_percentiles(self):
+        result = dict()
+        for name, values in list(self.values.items()):
+            values = list(values)
+            if values:
+                result[name] = tuple(np.percentile(values, self.percentiles))
+        return result
+
+    def clear(self):
+        self.durations.clear()
+        self.ticks.clear()
+        self.values.clear()
+
+    def __str__(self):
+        logs = f"{'Stage (ms)':<18}" + "".join(
+            f"{f'p{p}':>8}" for p in self.percentiles
+        )
+        for stage, values in self.get_percentiles().items():
+            logs += f"\n{stage:<18}" + "".join(f"{v:>8.1f}" for v in values)
+
+        value_percentiles = self.get_value_percentiles()
+        if value_percentiles:
+            logs += f"\n\n{'Value':<18}" + "".join(
+                f"{f'p{p}':>8}" for p in self.percentiles
+            )
+        for name, values in value_percentiles.items():
+            logs += f"\n{name:<18}" + "".join(f"{v:>8.3f}" for v in values)
+
+        fps = ", ".join(f"{loop} {self.fps(loop):.1f}" for loop in list(self.ticks))
+        return f"{logs}\n\nFPS: {fps}\n"
+
+
+class CameraPipeline:
+    """
+    Capture -> pose -> BodyState -> Events pipeline without Qt. The UI gets the
+    results through the on_status, on_state and on_frame hooks.
+
+    Stages are connected by latest-frame-wins queues, so capture never waits for
+    inference and inference never waits for the preview. The preview stage only
+    runs if preview is enabled.
+
+    The pose model is kept between camera sessions and camera switches, it is
+    only rebuilt when the mediapipe config changed.
+    """
+
+    def __init__(
+        self, body: BodyState, mp_config: dict, camera_config: dict, preview=True
+    ):
+        self.status = False
+        self.cap = None
+        self.body = body
+        self.mp_config = mp_config
+        self.camera_config = camera_config
+        self.camera_port = 0
+        self.preview = preview
+        self.timings = StageTimings()
+
+        # set when the pipeline starts
+        self.landmarks_style = None
+
+        # pose model and the mediapipe config it was built with
+        self.pose = None
+        self.pose_config = None
+        self.pose_in_process = False
+        self.pose_lock = threading.Lock()
+        # (pose, config, in_process) built in the background, see start_pose_switch
+        self.next_pose = None
+        self.governor = ComplexityGovernor(
+            camera_config["frame_budget"] / 1000, mp_config["model_complexity"]
+        )
+        self.roi = RegionOfInterest()
+        self.background_blur = BackgroundBlur()
+
+    # Called with dict(loading=bool) when the camera is loading or stopped, and
+    # with a progress message while the pose model warms up
+    def on_status(self, status: dict):
+        pass
+
+    # Called after each processed frame
+    def on_state(self):
+        pass
+
+    # Called with the RGB preview image of a processed frame
+    def on_frame(self, image: np.ndarray):
+        pass
+
+    def run(self):
+        print("run mediapipe", self.mp_config)
+        self.on_status(dict(loading=True))
+        self.cap = self.open_capture(self.camera_port)
+        self.timings.clear()
+
+        capture_queue = LatestQueue()
+        render_queue = LatestQueue()
+        capture_thread = threading.Thread(
+            target=self.capture_loop, args=(capture_queue,), daemon=True
+        )
+        render_thread = threading.Thread(
+            target=self.render_loop, args=(render_queue,), daemon=True
+        )
+
+        recorder = None
+
+        try:
+            # time from reading the frame of an event to pressing its key
+            self.body.events.on_press = lambda latency: self.timings.add(
+                "capture to key", latency / 1000
+            )
+
+            adaptive = self.camera_config["adaptive_model_complexity"]
+            self.governor.budget = self.camera_config["frame_budget"] / 1000
+            roi = self.roi if self.camera_config["roi_cropping"] else None
+            self.roi.reset()
+
+            inference_interval = max(self.camera_config["inference_interval"], 1)
+            extrapolator = LandmarksExtrapolator()
+            extrapolated = np.zeros_like(self.body.raw_landmarks)
+            frame_index = 0
+            results = None
+            pose_switch = None
+
+            if self.body.record_landmarks:
+                recorder = LandmarksRecorder(
+                    fps=self.cap.get(cv2.CAP_PROP_FPS),
+                    model_complexity=self.mp_config["model_complexity"],
+                )
+
+            if self.landmarks_style is None:
+                self.landmarks_style = rgb_drawing_styles(
+                    mp_solutions().drawing_styles.get_default_pose_landmarks_style()
+                )
+            # not on the first key press, keys are pressed under the processor lock.
+            # It is loaded on the first key press if the keyboard is enabled later
+            if self.body.events.keyboard_enabled:
+                try:
+                    pynput_keyboard()
+                except ImportError:
+                    print(traceback.format_exc())
+            with self.pose_lock:
+                pose = self.get_pose()
+
+            capture_thread.start()
+            if self.preview:
+                render_thread.start()
+
+            while self.status:
+                frame = capture_queue.get(timeout=0.5)
+                if frame is None:
+                    if not capture_thread.is_alive():
+                        break
+                    continue
+
+                image, timestamp = frame
+
+                # Run the pose detection on every inference_interval frame, the frames
+                # in between get landmarks extrapolated from the latest detections
+                infer = frame_index % inference_interval == 0 or results is None
+                frame_index += 1
+
+                # To improve performance, optionally mark the image as not writeable to
+                # pass by reference.
+                # Recolor image to RGB
+                if infer or self.preview:
+                    with self.timings.measure("cvtColor rgb"):
+                        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                    image.flags.writeable = False
+
+                if infer:
+                    # Make detection on the downscaled frame, or on the body crop in ROI mode
+                    input_image = image
+                    height, width = image.shape[:2]
+                    inference_size = self.get_inference_size(width, height)
+                    if inference_size != (width, height):
+                        with self.timings.measure("resize"):
+                            input_image = cv2.resize(
+                                image, inference_size, interpolation=cv2.INTER_AREA
+                            )
+                    frame_shape = input_image.shape
+
+                    if roi is not None:
+                        with self.timings.measure("roi crop"):
+                            input_image = roi.crop(input_image)
+
+                    start = time.perf_counter()
+                    results = pose.process(input_image)
+                    duration = time.perf_counter() - start
+                    self.timings.add("pose.process", duration)
+
+                    if roi is not None:
+                        results = roi.to_frame(results, frame_shape)
+
+                    if adaptive:
+                        if pose_switch is not None:
+                            # latencies of the previous model are not counted
+                            # while the next one is built
+                            if not pose_switch.is_alive():
+                                pose_switch = None
+                                with self.pose_lock:
+                                    pose = self.get_pose()
+                        elif (
+                            self.governor.add(duration)
+                            != self.pose_config["model_complexity"]
+                        ):
+                            pose_switch = self.start_pose_switch()
+                    if "first inference" not in startup_profile.milestones:
+                        startup_profile.mark("first inference")
+                        startup_profile.report(startup_profile_path)
+
+                    with self.timings.measure("body.calculate"):
+                        if isinstance(results, PoseArrays):
+                            # landmarks of the pose process are already arrays
+                            pose_landmarks, world_landmarks = (
+                                (None, None)
+                                if results.landmarks is None
+                                else results.landmarks
+                            )
+                            detected = self.body.calculate_landmarks(
+                                pose_landmarks, world_landmarks, timestamp
+                            )
+                        else:
+                            detected = self.body.calculate(results, timestamp)
+                    self.timings.tick("inference")
+
+                    if roi is not None:
+                        roi.update(
+                            self.body.raw_pose_landmarks if detected else None,
+                            frame_shape,
+                        )
+
+                    if recorder is not None:
+                        if detected:
+                            recorder.add(
+                                timestamp,
+                                self.body.raw_pose_landmarks,
+                                self.body.raw_world_landmarks,
+                            )
+                        else:
+                            recorder.add(timestamp)
+
+                    if inference_interval > 1:
+                        if detected:
+                            drift = extrapolator.update(
+                                self.body.raw_landmarks, timestamp
+                            )
+                            if drift is not None:
+                                self.timings.add_value("extrapolation drift", drift)
+                        else:
+                            extrapolator.reset()
+                elif extrapolator.timestamp is not None:
+                    extrapolator.extrapolate(timestamp, out=extrapolated)
+                    with self.timings.measure("body.calculate"):
+                        self.body.calculate_landmarks(
+                            extrapolated[0], extrapolated[1], timestamp
+                        )
+                    self.timings.tick("extrapolation")
+
+                if self.preview:
+                    render_queue.put((image, results))
+                self.on_state()
+        except Exception:
+            print(traceback.format_exc())
+        finally:
+            self.status = False
+            capture_queue.close()
+            render_queue.close()
+            if capture_thread.is_alive():
+                capture_thread.join()
+            if render_thread.is_alive():
+                render_thread.join()
+
+            print("stop camera")
+            self.cap.release()
+
+            if recorder is not None:
+                recorder.close()
+            self.on_status(dict(loading=False))
+
+    # Mediapipe config of the pose model, in adaptive mode the model complexity
+    # is picked by the governor up to the configured one
+    def get_pose_config(self):
+        config = dict(self.mp_config)
+        if self.camera_config["adaptive_model_complexity"]:
+            self.governor.set_max_complexity(config["model_complexity"])
+            config["model_complexity"] = self.governor.complexity
+        return config
+
+    # Returns the pose model, built again only if the mediapipe config changed
+    # since it was built, e.g. the model complexity or the segmentation, if it
+    # moved in or out of the inference process or if the inference process stopped
+    def get_pose(self):
+        config = self.get_pose_config()
+        in_process = self.camera_config["inference_process"]
+
+        # swap in the model built in the background if it is still the one needed
+        if self.next_pose is not None:
+            pose, pose_config, pose_in_process = self.next_pose
+            self.next_pose = None
+            if pose_config == config and pose_in_process == in_process:
+                self.close_pose()
+                self.pose = pose
+                self.pose_config = pose_config
+                self.pose_in_process = pose_in_process
+            else:
+                pose.close()
+
+        if (
+            self.pose is None
+            or self.pose_config != config
+            or self.pose_in_process != in_process
+            or getattr(self.pose, "closed", False)
+        ):
+            self.close_pose()
+            self.pose_config = config
+            self.pose_in_process = in_process
+            self.pose = self.build_pose(config, in_process)
+        return self.pose
+
+    def build_pose(self, config: dict, in_process: bool):
+        print(
+            "load pose model",
+            config,
+            "in a separate process" if in_process else "",
+        )
+        if in_process:
+            try:
+                return PoseProcess(**config)
+            except RuntimeError:
+                print(traceback.format_exc())
+                print("run the pose detection in the app process instead")
+        return mp_solutions().pose.Pose(**config)
+
+    # Build the model of the current config in a background thread, like the
+    # warm-up, the inference keeps the previous model until get_pose() swaps it in
+    def start_pose_switch(self):
+        config = self.get_pose_config()
+        in_process = self.camera_config["inference_process"]
+        thread = threading.Thread(
+            target=self.switch_pose, args=(config, in_process), daemon=True
+        )
+        thread.start()
+        return thread
+
+    def switch_pose(self, config: dict, in_process: bool):
+        try:
+            pose = self.build_pose(config, in_process)
+        except Exception:
+            print(traceback.format_exc())
+            return
+
+        with self.pose_lock:
+            if self.next_pose is not None:
+                self.next_pose[0].close()
+            self.next_pose = (pose, config, in_process)
+
+    # Build the pose model and run the first slow inferences on blank frames in a
+    # background thread, the camera waits for the warm-up if started meanwhile
+    def start_warm_up(self):
+        thread = threading.Thread(target=self.warm_up, daemon=True)
+        thread.start()
+        return thread
+
+    def warm_up(self):
+        with self.pose_lock:
+            try:
+                self.on_status(dict(loading=True, message="Loading pose model..."))
+                pose = self.get_pose()
+
+                width, height = self.get_inference_size(
+                    self.camera_config["capture_width"] or 640,
+                    self.camera_config["capture_height"] or 480,
+                )
+                image = np.zeros((height, width, 3), dtype=np.uint8)
+                image.flags.writeable = False
+                for i in range(warm_up_frames):
+                    self.on_status(
+                        dict(
+                            loading=True,
+                            message=f"Warming up pose model {i + 1}/{warm_up_frames}...",
+                        )
+                    )
+                    pose.process(image)
+                startup_profile.mark("pose model warm")
+            except Exception:
+                print(traceback.format_exc())
+
+        self.on_status(dict(loading=False))
+
+    def close_pose(self):
+        if self.pose is not None:
+            self.pose.close()
+            self.pose = None
+        if self.next_pose is not None:
+            self.next_pose[0].close()
+            self.next_pose = None
+
+    # Open the camera with the capture settings of the camera config, the driver
+    # may not support all of them
+    def open_capture(self, camera_port: int):
+        cap = cv2.VideoCapture(camera_port)
+        config = self.camera_config
+
+        # the pixel format is set first, it limits the available sizes and rates
+        if config["capture_fourcc"]:
+            cap.set(
+                cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*config["capture_fourcc"])
+            )
+        if config["capture_width"] and config["capture_height"]:
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, config["capture_width"])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, config["capture_height"])
+        if config["capture_fps"]:
+            cap.set(cv2.CAP_PROP_FPS, config["capture_fps"])
+        if config["capture_buffer_size"]:
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, config["capture_buffer_size"])
+
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        print(
+            "capture",
+            fourcc.to_bytes(4, "little").decode(errors="replace"),
+            f"{cap.get(cv2.CAP_PROP_FRAME_WIDTH):.0f}x{cap.get(cv2.CAP_PROP_FRAME_HEIGHT):.0f}",
+            f"{cap.get(cv2.CAP_PROP_FPS):.0f} fps",
+        )
+        return cap
+
+    # Size of the frames given to the pose detection for a capture size
+    def get_inference_size(self, width: int, height: int):
+        inference_width = self.camera_config["inference_width"]
+        if not inference_width or inference_width >= width:
+            return width, height
+        return inference_width, round(height * inference_width / width)
+
+    # Capture stage: read frames as fast as the camera delivers them. When
+    # camera_port changes, the camera is switched without stopping the pipeline.
+    def capture_loop(self, capture_queue: LatestQueue):
+        camera_port = self.camera_port
+        loading = True
+        while self.status:
+            if self.camera_port != camera_port:
+                camera_port = self.camera_port
+                print("switch camera", camera_port)
+                loading = True
+                self.on_status(dict(loading=True))
+                self.cap.release()
+                self.cap = self.open_capture(camera_port)
+
+            if not self.cap.isOpened():
+                break
+
+            with self.timings.measure("cap.read"):
+                success, image = self.cap.read()
+            if not success:
+                print("Ignoring empty camera frame.")
+                # If loading a video, use 'break' instead of 'continue'.
+                continue
+
+            if loading:
+                loading = False
+                self.on_status(dict(loading=False))
+
+            # the position of live cameras is often 0 or not monotonic, frames are
+            # stamped with the time they were read instead
+            timestamp = time.monotonic() * 1000  # ms
+
+            capture_queue.put((image, timestamp))
+            self.timings.tick("capture")
+
+    # Whether the preview can take a new frame, frames are not drawn otherwise
+    def wants_frame(self):
+        return True
+
+    # Render stage: draw overlays on the latest processed frame for the preview
+    def render_loop(self, render_queue: LatestQueue):
+        next_render_time = 0
+        while self.status:
+            item = render_queue.get(timeout=0.5)
+            if item is None or not self.wants_frame():
+                continue
+
+            # limit the preview frame rate, skipped frames are not drawn. Frames a
+            # bit early for the capture jitter are drawn, and the next deadline
+            # follows the previous one so the average rate is kept
+            interval = 1 / self.camera_config["preview_fps"]
+            now = time.perf_counter()
+            if now < next_render_time - interval / 4:
+                continue
+            next_render_time = max(next_render_time + interval, now)
+
+            image, results = item
+
+            try:
+                self.on_frame(self.draw_frame(image, results))
+            except Exception:
+                print(traceback.format_exc())
+            self.timings.tick("preview")
+
+    # Returns the RGB image with segmentation, landmarks and body overlays,
+    # colors of the overlays are RGB
+    def draw_frame(self, image, results):
+        # Inference is done with the frame, draw directly on the RGB buffer
+        image.flags.writeable = True
+
+        if (
+            self.mp_config["enable_segmentation"]
+            and results.segmentation_mask is not None
+        ):
+            with self.timings.measure("segmentation"):
+                try:
+                    # Draw selfie segmentation on the blurred background.
+                    # To improve segmentation around boundaries, consider applying a joint
+                    # bilateral filter to "results.segmentation_mask" with "image".
+                    self.background_blur.apply(
+                        image,
+                        results.segmentation_mask,
+                        self.camera_config["segmentation_mask_interval"],
+                    )
+                except Exception:
+                    print(traceback.format_exc())
+
+        # Draw landmark annotation on the image.
+        with self.timings.measure("draw_landmarks"):
+            solutions = mp_solutions()
+            solutions.drawing_utils.draw_landmarks(
+                image,
+                results.pose_landmarks,
+                solutions.pose.POSE_CONNECTIONS,
+                landmark_drawing_spec=self.landmarks_style,
+            )
+
+            if results.pose_landmarks:
+                self.body.draw(image)
+
+        return image
@@ -0,0 +1,147 @@
+import os
+import json
+import struct
+import numpy as np
+from datetime import datetime
+from .config import recordings_dir
+from .body import LANDMARKS_COUNT, LANDMARK_NAMES, LANDMARK_INDEXES
+
+# File layout: MAGIC, uint16 version, uint32 header size, JSON header padded with
+# spaces to HEADER_ALIGNMENT, then fixed size records until the end of the file.
+MAGIC = b"MMLM"
+VERSION = 1
+PREFIX = struct.Struct("<4sHI")
+HEADER_ALIGNMENT = 64
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<f8"),
+        ("detected", "?"),
+        ("pose_landmarks", "<f4", (LANDMARKS_COUNT, 4)),
+        ("world_landmarks", "<f4", (LANDMARKS_COUNT, 4)),
+    ],
+    align=True,
+)
+
+RECORDING_EXTENSION = ".landmarks"
+
+
+class LandmarksRecorder:
+    """
+    Streams the pose and world landmarks of each processed frame of a camera
+    session to a recording file, frames without a detected body are kept with
+    detected=False.
+    """
+
+    def __init__(self, path=None, fps=0, model_complexity=None):
+        if path is None:
+            os.makedirs(recordings_dir, exist_ok=True)
+            path = os.path.join(
+                recordings_dir,
+                datetime.now().strftime("%Y%m%d_%H%M%S") + RECORDING_EXTENSION,
+            )
+        self.path = path
+        self.frames = 0
+
+        # reused for every frame
+        self.record = np.zeros(1, dtype=RECORD_DTYPE)
+
+        self.file = open(path, "wb")
+        self.file.write(
+            encode_header(
+                dict(
+                    landmark_names=LANDMARK_NAMES,
+                    landmark_indexes=LANDMARK_INDEXES.tolist(),
+                    fps=fps,
+                    model_complexity=model_complexity,
+                    created=datetime.now().isoformat(),
+                )
+            )
+        )
+
+    def __len__(self):
+        return self.frames
+
+    def add(self, timestamp, pose_landmarks=None, world_landmarks=None):
+        record = self.record
+        detected = pose_landmarks is not None and world_landmarks is not None
+
+        record["timestamp"] = timestamp
+        record["detected"] = detected
+        record["pose_landmarks"] = pose_landmarks if detected else 0
+        record["world_landmarks"] = world_landmarks if detected else 0
+
+        self.file.write(self.record.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+        print(f"saved {self.frames} frames to {self.path}")
+
+
+class LandmarksRecording:
+    """
+    Memory mapped recording, records are read from disk only when accessed.
+
+    records["timestamp"] (n,), records["detected"] (n,),
+    records["pose_landmarks"] (n, 33, 4), records["world_landmarks"] (n, 33, 4)
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(path, "rb") as f:
+            self.header, header_size = decode_header(f)
+
+        self.fps = self.header["fps"]
+        self.model_complexity = self.header["model_complexity"]
+        self.landmark_names = self.header["landmark_names"]
+
+        # ignore a partially written last record
+        count = (os.path.getsize(path) - header_size) // RECORD_DTYPE.itemsize
+        self.records = (
+            np.memmap(
+                path, dtype=RECORD_DTYPE, mode="r", offset=header_size, shape=(count,)
+            )
+            if count
+            else np.zeros(0, dtype=RECORD_DTYPE)
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def time_range(self, start=None, end=None):
+        """
+        Records with start <= time < end, in ms from the first record. Timestamps
+        are the monotonic capture times of the session.
+        """
+        timestamps = self.records["timestamp"]
+        first = timestamps[0] if len(timestamps) else 0
+        i = 0 if start is None else np.searchsorted(timestamps, first + start, "left")
+        j = (
+            len(timestamps)
+            if end is None
+            else np.searchsorted(timestamps, first + end, "left")
+        )
+        return self.records[i:j]
+
+
+def encode_header(header: dict):
+    data = json.dumps(header).encode("utf-8")
+    size = PREFIX.size + len(data)
+    size += -size % HEADER_ALIGNMENT
+    return PREFIX.pack(MAGIC, VERSION, size) + data.ljust(size - PREFIX.size, b" ")
+
+
+def decode_header(f):
+    magic, version, size = PREFIX.unpack(f.read(PREFIX.size))
+    if magic != MAGIC:
+        raise ValueError(f"{f.name} is not a landmarks recording")
+    if version > VERSION:
+        raise ValueError(f"Unsupported recording version {version}")
+
+    header = json.loads(f.read(size - PREFIX.size))
+    return header, size
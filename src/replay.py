@@ -0,0 +1,103 @@
+import argparse
+import time
+from copy import deepcopy
+from .body import BodyState
+from .config import AppConfig
+from .recording import LandmarksRecording
+
+
+def replay(
+    recording: LandmarksRecording,
+    body_config: dict,
+    events_config: dict,
+    start=None,
+    end=None,
+):
+    """
+    Feed recorded landmarks through BodyState as fast as possible, without camera
+    and pose inference. Returns the detected events and the replay speed.
+    start and end limit the replay to a time range of the recording, in ms from
+    the first frame.
+    """
+    body = BodyState(body_config, events_config)
+
+    events = []
+    body.events.on_add = lambda name, command_type, timestamp: events.append(
+        dict(name=name, type=command_type, timestamp=timestamp)
+    )
+
+    records = recording.time_range(start, end)
+    timestamps = records["timestamp"]
+
+    start_time = time.perf_counter()
+    for timestamp, detected, pose_landmarks, world_landmarks in zip(
+        timestamps.tolist(),
+        records["detected"],
+        records["pose_landmarks"],
+        records["world_landmarks"],
+    ):
+        if detected:
+            body.calculate_landmarks(pose_landmarks, world_landmarks, timestamp)
+        else:
+            body.calculate_landmarks(None, None, timestamp)
+    elapsed = time.perf_counter() - start_time
+
+    frames = len(timestamps)
+    duration = (timestamps[-1] - timestamps[0]) / 1000 if frames > 1 else 0
+
+    return dict(
+        events=events,
+        frames=frames,
+        elapsed=elapsed,
+        fps=frames / elapsed if elapsed else 0,
+        speed=duration / elapsed if elapsed else 0,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a landmarks recording through the movement detection."
+    )
+    parser.add_argument("path", help="recording file")
+    parser.add_argument(
+        "--start", type=float, help="start of the replayed range in seconds"
+    )
+    parser.add_argument(
+        "--end", type=float, help="end of the replayed range in seconds"
+    )
+    parser.add_argument(
+        "--keyboard",
+        action="store_true",
+        help="send the key events of the config while replaying",
+    )
+    args = parser.parse_args()
+
+    app_config = AppConfig()
+    events_config = deepcopy(app_config.events_config)
+    events_config["keyboard_enabled"] = args.keyboard
+
+    recording = LandmarksRecording(args.path)
+    print(
+        f"{len(recording)} frames, {recording.fps:.0f} fps, "
+        f"model complexity {recording.model_complexity}"
+    )
+
+    result = replay(
+        recording,
+        app_config.body_config,
+        events_config,
+        start=None if args.start is None else args.start * 1000,
+        end=None if args.end is None else args.end * 1000,
+    )
+
+    for event in result["events"]:
+        print(f"{event['timestamp']:>10.0f} ms  {event['name']} ({event['type']})")
+
+    print(
+        f"{len(result['events'])} events, {result['frames']} frames in {result['elapsed']:.2f}s: "
+        f"{result['fps']:.0f} frames/s, {result['speed']:.1f}x real time"
+    )
+
+
+if __name__ == "__main__":
+    main()
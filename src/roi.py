@@ -0,0 +1,109 @@
+import numpy as np
+
+
+class RegionOfInterest:
+    """
+    Crop box around the tracked body for the pose inference, from the landmarks of
+    the previous frame. The full frame is used until a body is detected and again
+    when the tracking is lost.
+
+    The box only moves when the body gets close to its edges or becomes much
+    smaller than it, so the tracking inside mediapipe gets a stable input.
+    """
+
+    def __init__(
+        self, padding=0.25, margin=0.05, max_area_ratio=2, full_frame_ratio=0.8
+    ):
+        self.padding = padding  # of the body size on each side
+        self.margin = margin  # of the body size to the box edges before moving it
+        self.max_area_ratio = max_area_ratio  # of the box to the padded body area
+        self.full_frame_ratio = full_frame_ratio  # of the frame area to use it whole
+
+        self.box = None  # (x0, y0, x1, y1) in pixels
+
+    def reset(self):
+        self.box = None
+
+    # Returns the part of the image to run the pose inference on
+    def crop(self, image: np.ndarray):
+        if self.box is None:
+            return image
+        x0, y0, x1, y1 = self.box
+        return np.ascontiguousarray(image[y0:y1, x0:x1])
+
+    # Map the landmarks and the segmentation mask of the results of the cropped
+    # image back to the full frame, landmarks are normalized to the full frame
+    def to_frame(self, results, shape: tuple):
+        if self.box is None:
+            return results
+
+        h, w = shape[:2]
+        x0, y0, x1, y1 = self.box
+        scale_x = (x1 - x0) / w
+        scale_y = (y1 - y0) / h
+        offset_x = x0 / w
+        offset_y = y0 / h
+
+        landmarks = getattr(results, "landmarks", None)
+        if landmarks is not None:
+            # (2, 33, 4) arrays of PoseProcess, world landmarks are not normalized
+            pose_landmarks = landmarks[0]
+            pose_landmarks[:, 0] = pose_landmarks[:, 0] * scale_x + offset_x
+            pose_landmarks[:, 1] = pose_landmarks[:, 1] * scale_y + offset_y
+            # z uses the same scale as x
+            pose_landmarks[:, 2] *= scale_x
+        elif results.pose_landmarks:
+            for landmark in results.pose_landmarks.landmark:
+                landmark.x = landmark.x * scale_x + offset_x
+                landmark.y = landmark.y * scale_y + offset_y
+                # z uses the same scale as x
+                landmark.z *= scale_x
+
+        mask = getattr(results, "segmentation_mask", None)
+        if mask is not None:
+            frame_mask = np.zeros((h, w), dtype=mask.dtype)
+            frame_mask[y0:y1, x0:x1] = mask
+            results = results._replace(segmentation_mask=frame_mask)
+
+        return results
+
+    # Compute the next crop box from the (33, 4) landmarks of the current frame,
+    # normalized to the full frame, or None if no body was detected
+    def update(self, landmarks: np.ndarray, shape: tuple):
+        if landmarks is None:
+            self.box = None
+            return
+
+        h, w = shape[:2]
+        xy = landmarks[:, :2] * (w, h)
+        bx0, by0 = xy.min(axis=0)
+        bx1, by1 = xy.max(axis=0)
+        size = max(bx1 - bx0, by1 - by0)
+        padding = self.padding * size
+
+        if self.box is not None:
+            x0, y0, x1, y1 = self.box
+            margin = self.margin * size
+            inside = (
+                bx0 >= x0 + margin
+                and by0 >= y0 + margin
+                and bx1 <= x1 - margin
+                and by1 <= y1 - margin
+            )
+            padded_area = (bx1 - bx0 + 2 * padding) * (by1 - by0 + 2 * padding)
+            if inside and (x1 - x0) * (y1 - y0) <= self.max_area_ratio * padded_area:
+                return
+
+        x0 = int(max(bx0 - padding, 0))
+        y0 = int(max(by0 - padding, 0))
+        x1 = int(min(bx1 + padding, w))
+        y1 = int(min(by1 + padding, h))
+
+        if (
+            x1 <= x0
+            or y1 <= y0
+            or (x1 - x0) * (y1 - y0) >= self.full_frame_ratio * w * h
+        ):
+            self.box = None
+        else:
+            self.box = (x0, y0, x1, y1)
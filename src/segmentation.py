@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class BackgroundBlur:
+    """
+    Blurs the background of preview frames with the segmentation mask of the pose
+    detection. The blur runs on a downscaled frame that is upsampled again, the
+    single channel mask is broadcast over the color channels and all buffers are
+    kept between frames.
+    """
+
+    def __init__(self, scale=4, kernel_size=55, threshold=0.1):
+        self.scale = scale  # downscale factor of the blurred frame
+        self.kernel_size = kernel_size  # of the blur at full size
+        self.threshold = threshold  # mask values of the body
+
+        self.shape = None
+        self.frame_index = 0
+
+    # Allocate the buffers for a frame shape
+    def allocate(self, shape: tuple):
+        self.shape = shape
+        height, width = shape[:2]
+        self.small_size = (max(width // self.scale, 1), max(height // self.scale, 1))
+        self.small = np.empty((self.small_size[1], self.small_size[0], 3), np.uint8)
+        self.small_blurred = np.empty_like(self.small)
+        self.background = np.empty(shape, np.uint8)
+        self.mask = np.empty(shape[:2], np.float32)
+        self.background_mask = np.zeros(shape[:2], bool)
+
+        # odd kernel of the same blur radius on the small frame
+        kernel_size = self.kernel_size // self.scale
+        self.small_kernel_size = kernel_size + 1 - kernel_size % 2
+
+    # Blur the background of the RGB image in place. The mask is computed again
+    # every mask_interval frames.
+    def apply(self, image: np.ndarray, mask: np.ndarray, mask_interval=1):
+        if image.shape != self.shape:
+            self.allocate(image.shape)
+            self.frame_index = 0
+
+        if self.frame_index % mask_interval == 0:
+            # the mask has the inference size
+            if mask.shape != self.mask.shape:
+                cv2.resize(mask, (self.shape[1], self.shape[0]), dst=self.mask)
+                mask = self.mask
+            np.less_equal(mask, self.threshold, out=self.background_mask)
+        self.frame_index += 1
+
+        cv2.resize(image, self.small_size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(
+            self.small,
+            (self.small_kernel_size, self.small_kernel_size),
+            0,
+            dst=self.small_blurred,
+        )
+        cv2.resize(
+            self.small_blurred,
+            (self.shape[1], self.shape[0]),
+            dst=self.background,
+            interpolation=cv2.INTER_LINEAR,
+        )
+
+        np.copyto(image, self.background, where=self.background_mask[..., None])
+        return image
@@ -0,0 +1,54 @@
+import math
+import numpy as np
+
+
+class OneEuroFilter:
+    """
+    One Euro low-pass filter (Casiez et al., 2012) over a whole landmark array in
+    one vectorized step. The cutoff frequency of each value rises with its speed,
+    so jitter of still landmarks is smoothed while fast movements keep a low lag.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0, max_gap=500):
+        self.min_cutoff = min_cutoff  # Hz
+        self.beta = beta  # cutoff increase per unit/s of speed
+        self.d_cutoff = d_cutoff  # Hz, of the speed estimate
+        self.max_gap = max_gap  # ms without values before starting over
+
+        self.value = None
+        self.speed = None
+        self.timestamp = None
+
+    def reset(self):
+        self.value = None
+
+    # Filter x (any shape) at timestamp in ms, the result is written to out
+    def filter(self, x: np.ndarray, timestamp: float, out: np.ndarray = None):
+        if out is None:
+            out = np.empty_like(x)
+
+        dt = None if self.value is None else (timestamp - self.timestamp) / 1000
+        self.timestamp = timestamp
+        if dt is None or dt > self.max_gap / 1000:
+            self.value = np.array(x, dtype=float)
+            self.speed = np.zeros_like(self.value)
+            out[:] = x
+            return out
+        if dt <= 0:
+            # timestamps may not be unique, e.g. cameras without timestamps
+            dt = 1 / 30
+
+        speed = (x - self.value) / dt
+        self.speed += self.alpha(self.d_cutoff, dt) * (speed - self.speed)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.speed)
+        self.value += self.alpha(cutoff, dt) * (x - self.value)
+
+        out[:] = self.value
+        return out
+
+    # Smoothing factor of an exponential filter for a cutoff frequency
+    @staticmethod
+    def alpha(cutoff, dt: float):
+        r = 2 * math.pi * cutoff * dt
+        return r / (r + 1)
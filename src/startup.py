@@ -0,0 +1,62 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Process start is approximated by the first import of this module
+start_time = time.perf_counter()
+
+
+class StartupProfile:
+    """
+    Import time of the heavy modules and time from launch to startup milestones
+    (first window, first inference), in seconds.
+    """
+
+    def __init__(self):
+        self.imports = dict()
+        self.milestones = dict()
+
+    @contextmanager
+    def measure_import(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.imports[name] = self.imports.get(name, 0) + (
+                time.perf_counter() - start
+            )
+
+    # Record the time since launch of a milestone, only the first time
+    def mark(self, name: str):
+        if name not in self.milestones:
+            self.milestones[name] = time.perf_counter() - start_time
+
+    # Print the report and append it to the profile file to track regressions
+    def report(self, path: str):
+        print(self)
+        try:
+            with open(path, "a") as f:
+                f.write(
+                    json.dumps(
+                        dict(
+                            time=datetime.now().isoformat(),
+                            imports=self.imports,
+                            milestones=self.milestones,
+                        )
+                    )
+                    + "\n"
+                )
+        except OSError as e:
+            print(f"cannot save startup profile: {e}")
+
+    def __str__(self):
+        logs = "Startup profile\n"
+        for name, duration in self.imports.items():
+            logs += f"  import {name}: {duration * 1000:.0f} ms\n"
+        for name, duration in self.milestones.items():
+            logs += f"  {name}: {duration * 1000:.0f} ms\n"
+        return logs
+
+
+startup_profile = StartupProfile()
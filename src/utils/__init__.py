@@ -1,42 +1,37 @@
 import numpy as np
+import threading
+import time
 from typing import Literal
 import cv2
 from ..config import IMAGE_WIDTH, IMAGE_HEIGHT
 
 
-# calculate angle in 3D space
-def calculate_angle(a, b, c):
-    if a is None or b is None or c is None:
-        return None
+# calculate angles at b for batches of landmark index triples (a, b, c) in degrees,
+# NaN if one of the landmarks is not visible
+def calculate_angles(landmarks, visibility, types, a, b, c):
+    ba = landmarks[types, a] - landmarks[types, b]
+    bc = landmarks[types, c] - landmarks[types, b]
 
-    a = np.array(a)
-    b = np.array(b)
-    c = np.array(c)
-
-    ba = a - b
-    bc = c - b
-
-    cosine_angle = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc))
-    angle = np.arccos(cosine_angle)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosine_angles = np.einsum("ij,ij->i", ba, bc) / (
+            np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1)
+        )
+        angles = np.degrees(np.arccos(cosine_angles))
 
-    return np.degrees(angle)
+    angles[~(visibility[a] & visibility[b] & visibility[c])] = np.nan
+    return angles
 
 
-# calculate slope of a line in 3D space in degrees
-def calculate_slope(a, b):
-    if a is None or b is None:
-        return None
-
-    a = np.array(a)
-    b = np.array(b)
-
-    dx = b[0] - a[0]
-    dy = b[1] - a[1]
+# calculate slopes for batches of landmark index pairs (a, b) in degrees,
+# NaN if one of the landmarks is not visible
+def calculate_slopes(landmarks, visibility, types, a, b):
+    d = landmarks[types, b] - landmarks[types, a]
 
-    angle = np.arctan(dy / dx)
-    angle = angle * 180.0 / np.pi
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slopes = np.degrees(np.arctan(d[:, 1] / d[:, 0]))
 
-    return angle
+    slopes[~(visibility[a] & visibility[b])] = np.nan
+    return slopes
 
 
 # calculate distance between two points in 3D space
@@ -102,15 +97,10 @@ def in_range(a, min: float, max: float):
     return a > min and a < max
 
 
-def get_landmark_coordinates(pose_landmarks, world_landmarks, landmark):
-    pose_value = pose_landmarks[landmark.value]
-    world_value = world_landmarks[landmark.value]
-
-    return {
-        "visibility": abs(pose_value.x) <= 1 and abs(pose_value.y) <= 1,
-        "pose": (pose_value.x, pose_value.y, pose_value.z, pose_value.visibility),
-        "world": (world_value.x, world_value.y, world_value.z, world_value.visibility),
-    }
+# copy (x, y, z, visibility) of mediapipe landmarks into a (n, 4) array
+def landmarks_to_array(landmarks, out):
+    out[:] = [(l.x, l.y, l.z, l.visibility) for l in landmarks]
+    return out
 
 
 def log_landmark(landmark):
@@ -126,34 +116,71 @@ def log_angle(angle):
     return f"{angle:.1f}"
 
 
-def list_camera_ports():
+def is_camera_port_working(port: int):
     """
-    Test the ports and returns a tuple with the available ports
-    and the ones that are working.
+    Test if the camera of the port opens and reads images.
     """
-    is_working = True
-    dev_port = 0
-    working_ports = []
-    available_ports = []
-    while is_working:
-        camera = cv2.VideoCapture(dev_port)
+    camera = cv2.VideoCapture(port)
+    try:
         if not camera.isOpened():
-            is_working = False
-            print("Port %s is not working." % dev_port)
+            print("Port %s is not working." % port)
+            return False
+
+        is_reading, img = camera.read()
+        w = camera.get(3)
+        h = camera.get(4)
+        if is_reading:
+            print("Port %s is working and reads images (%s x %s)" % (port, h, w))
         else:
-            is_reading, img = camera.read()
-            w = camera.get(3)
-            h = camera.get(4)
-            if is_reading:
-                print(
-                    "Port %s is working and reads images (%s x %s)" % (dev_port, h, w)
-                )
-                working_ports.append(dev_port)
-            else:
-                print(
-                    "Port %s for camera ( %s x %s) is present but does not reads."
-                    % (dev_port, h, w)
-                )
-                available_ports.append(dev_port)
-        dev_port += 1
-    return available_ports, working_ports
+            print(
+                "Port %s for camera ( %s x %s) is present but does not reads."
+                % (port, h, w)
+            )
+        return is_reading
+    finally:
+        camera.release()
+
+
+def scan_camera_ports(ports, on_port_checked, on_finished, timeout: float):
+    """
+    Test the ports concurrently in background threads. on_port_checked(port, working)
+    is called as each port responds, ports not responding within timeout seconds are
+    reported as not working. on_finished(working_ports) is called at the end.
+    Callbacks are called from the background threads.
+    """
+    lock = threading.Lock()
+    results = dict()
+
+    def check_port(port):
+        working = is_camera_port_working(port)
+        with lock:
+            if port in results:
+                return
+            results[port] = working
+        on_port_checked(port, working)
+
+    def run():
+        threads = [
+            threading.Thread(target=check_port, args=(port,), daemon=True)
+            for port in ports
+        ]
+        for thread in threads:
+            thread.start()
+
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+        timed_out = []
+        with lock:
+            for port in ports:
+                if port not in results:
+                    results[port] = False
+                    timed_out.append(port)
+        for port in timed_out:
+            print("Port %s timed out." % port)
+            on_port_checked(port, False)
+
+        on_finished([port for port in ports if results[port]])
+
+    threading.Thread(target=run, daemon=True).start()
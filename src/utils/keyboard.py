@@ -1,30 +1,39 @@
-from pynput.keyboard import Key
+import functools
+from ..startup import startup_profile
 
-keyboard_mappings = (
-    (Key.space, "space"),
-    (Key.shift, "shift"),
-    (Key.ctrl, "ctrl"),
-    (Key.tab, "tab"),
-    (Key.enter, "enter"),
-    (Key.esc, "esc"),
-    (Key.up, "up"),
-    (Key.down, "down"),
-    (Key.left, "left"),
-    (Key.right, "right"),
-)
 
-keyboard_special_key_names = [v for k, v in keyboard_mappings]
+# pynput takes long to load, it is imported once when the pipeline starts
+@functools.cache
+def pynput_keyboard():
+    with startup_profile.measure_import("pynput"):
+        from pynput import keyboard
+
+    return keyboard
+
+
+# Special keys of pynput Key by name
+keyboard_special_key_names = [
+    "space",
+    "shift",
+    "ctrl",
+    "tab",
+    "enter",
+    "esc",
+    "up",
+    "down",
+    "left",
+    "right",
+]
 
 
 def keyboard_to_str(key):
-    for k, v in keyboard_mappings:
-        if key == k:
-            return v
+    name = getattr(key, "name", None)
+    if name in keyboard_special_key_names:
+        return name
     return str(key)
 
 
 def str_to_keyboard(value):
-    for k, v in keyboard_mappings:
-        if value == v:
-            return k
+    if value in keyboard_special_key_names:
+        return getattr(pynput_keyboard().Key, value)
     return value
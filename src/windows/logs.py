@@ -1,36 +1,86 @@
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+from PySide6.QtGui import QFontDatabase
 from PySide6.QtWidgets import (
+    QHBoxLayout,
     QVBoxLayout,
     QLabel,
     QWidget,
     QMainWindow,
+    QFormLayout,
 )
+from ..body import BodyState
+from ..config import logs_update_interval
+from ..pipeline import StageTimings
+
+
+def set_label_text(label: QLabel, text: str):
+    if label.text() != text:
+        label.setText(text)
 
 
 class LogsWindow(QWidget):
+    """
+    Shows the body state and the pipeline timings. Values are refreshed by a
+    timer while the window is visible, only labels with changed values are updated.
+    """
 
     def __init__(
         self,
         parent_window: QMainWindow,
+        body: BodyState,
+        timings: StageTimings,
     ):
         super().__init__()
 
         self.parent_window = parent_window
+        self.body = body
+        self.timings = timings
 
         self.setWindowTitle("Logs")
 
-        log_layout = QVBoxLayout()
+        log_layout = QHBoxLayout()
         log_layout.setAlignment(Qt.AlignTop)
 
-        self.state_label = QLabel(self)
-        self.state_label.setWordWrap(True)
+        # the fields of the body state do not change, build their rows once
+        state_layout = QFormLayout()
+        state_layout.setAlignment(Qt.AlignTop)
+        self.state_labels: dict[str, QLabel] = dict()
+        for name, _ in self.body.get_log_fields():
+            label = QLabel(self)
+            state_layout.addRow(f"{name}:", label)
+            self.state_labels[name] = label
 
-        log_layout.addWidget(self.state_label)
+        # stage latencies and frame rates of the camera pipeline
+        self.timings_label = QLabel(self)
+        self.timings_label.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.timings_label.setAlignment(Qt.AlignTop)
+
+        log_layout.addLayout(state_layout)
+        log_layout.addWidget(self.timings_label)
 
         main_layout = QVBoxLayout()
         main_layout.addLayout(log_layout)
         self.setLayout(main_layout)
 
+        self.update_timer = QTimer(self)
+        self.update_timer.setInterval(logs_update_interval)
+        self.update_timer.timeout.connect(self.update_logs)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_logs()
+        self.update_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_timer.stop()
+
+    def update_logs(self):
+        for name, value in self.body.get_log_fields():
+            set_label_text(self.state_labels[name], value)
+
+        set_label_text(self.timings_label, str(self.timings))
+
     def toggle(self):
         if self.isVisible():
             self.hide()
@@ -40,7 +90,7 @@ class LogsWindow(QWidget):
             self.setGeometry(
                 x + self.parent_window.width() + 1,
                 y,
-                400,
+                700,
                 600,
             )
 
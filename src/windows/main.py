@@ -1,4 +1,4 @@
-from PySide6.QtCore import Qt, Slot
+from PySide6.QtCore import QEvent, Qt, Signal, Slot
 from PySide6.QtGui import QImage, QPixmap
 from PySide6.QtWidgets import (
     QComboBox,
@@ -23,36 +23,47 @@ from ..config import (
     IMAGE_HEIGHT,
     body_modes,
     auto_start_camera,
+    warm_up_pose_model,
+    max_camera_ports,
+    camera_port_timeout,
     AppConfig,
 )
-from ..utils import list_camera_ports
+from ..utils import scan_camera_ports
 from .events_config import EventsConfigWindow
 from .logs import LogsWindow
 
 
 class MainWindow(QMainWindow):
+    # emitted from the camera ports scan threads
+    camera_port_checked = Signal(int, bool)
+    camera_ports_scanned = Signal(list)
+
     def __init__(self):
         super().__init__()
 
         self.app_config = AppConfig()
 
-        print("get working camera ports")
-        _, self.camera_ports = list_camera_ports()
+        # start with the ports of the latest launch, updated by the scan
+        self.camera_ports = sorted(self.app_config.camera_config["camera_ports"])
 
         # Thread in charge of updating the image
         self.create_cv2_thread()
+        if self.camera_ports:
+            self.cv2_thread.pipeline.camera_port = self.camera_ports[0]
 
         # Create events config window
         self.events_config_window = EventsConfigWindow(
             parent_window=self,
             app_config=self.app_config,
-            movements=self.cv2_thread.body.movements,
+            movements=self.cv2_thread.pipeline.body.movements,
         )
         self.events_config_window.data_saved.connect(self.event_config_window_saved)
 
         # Create logs window
         self.logs_window = LogsWindow(
             parent_window=self,
+            body=self.cv2_thread.pipeline.body,
+            timings=self.cv2_thread.pipeline.timings,
         )
 
         # Title and dimensions
@@ -119,6 +130,19 @@ class MainWindow(QMainWindow):
         main_widget.setLayout(main_layout)
         self.setCentralWidget(main_widget)
 
+        print("get working camera ports")
+        self.camera_port_checked.connect(self.camera_port_checked_changed)
+        self.camera_ports_scanned.connect(self.camera_ports_scanned_changed)
+        scan_camera_ports(
+            range(max_camera_ports),
+            on_port_checked=self.camera_port_checked.emit,
+            on_finished=self.camera_ports_scanned.emit,
+            timeout=camera_port_timeout,
+        )
+
+        if warm_up_pose_model:
+            self.cv2_thread.pipeline.start_warm_up()
+
         # Auto start camera
         if auto_start_camera:
             self.cv2_thread.start()
@@ -137,6 +161,25 @@ class MainWindow(QMainWindow):
             self.pos().y(),
         )
 
+    # when window is shown, hidden, minimized or restored
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_preview_visible()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.update_preview_visible()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.update_preview_visible()
+
+    def update_preview_visible(self):
+        self.cv2_thread.pipeline.preview_visible = (
+            self.isVisible() and not self.isMinimized()
+        )
+
     def create_cv2_thread(self):
         self.cv2_thread = Cv2Thread(
             parent=self,
@@ -145,7 +188,6 @@ class MainWindow(QMainWindow):
         # self.cv2_thread.finished.connect(self.close)
         self.cv2_thread.update_status.connect(self.setCv2Status)
         self.cv2_thread.update_frame.connect(self.setCv2Image)
-        self.cv2_thread.update_state.connect(self.setCv2State)
 
     def cv2_btn_clicked(self):
         self.cv2_thread.toggle()
@@ -153,20 +195,17 @@ class MainWindow(QMainWindow):
     @Slot(QImage)
     def setCv2Image(self, image):
         self.camera_label.setPixmap(QPixmap.fromImage(image))
-
-    @Slot(dict)
-    def setCv2State(self, state: dict):
-        self.logs_window.state_label.setText(str(state["body"]))
+        self.cv2_thread.pipeline.frame_shown()
 
     @Slot(dict)
     def setCv2Status(self, status: dict):
         if status["loading"]:
-            self.cv2_btn.setText("Loading camera...")
+            self.cv2_btn.setText(status.get("message", "Loading camera..."))
             self.cv2_btn.setDisabled(True)
         else:
             self.cv2_btn.setDisabled(False)
 
-            if self.cv2_thread.status:
+            if self.cv2_thread.pipeline.status:
                 self.cv2_btn.setText("Stop camera")
             else:
                 self.cv2_btn.setText("Start camera")
@@ -201,14 +240,17 @@ class MainWindow(QMainWindow):
             value /= 100
         # print(key, value, type, input)
         if type == "mp":
-            self.cv2_thread.mp_config[key] = value
+            self.cv2_thread.pipeline.mp_config[key] = value
             self.app_config.mp_config[key] = value
         elif type == "body":
-            self.cv2_thread.body[key] = value
+            self.cv2_thread.pipeline.body[key] = value
             self.app_config.body_config[key] = value
         elif type == "events":
-            self.cv2_thread.body.events[key] = value
+            self.cv2_thread.pipeline.body.events[key] = value
             self.app_config.events_config[key] = value
+        elif type == "camera":
+            self.cv2_thread.pipeline.camera_config[key] = value
+            self.app_config.camera_config[key] = value
         self.app_config.save_config()
 
     def add_checkbox(self, checkbox: dict, layout: QBoxLayout):
@@ -224,6 +266,8 @@ class MainWindow(QMainWindow):
             checked = Qt.Checked if self.app_config.body_config[key] else Qt.Unchecked
         elif _type == "events":
             checked = Qt.Checked if self.app_config.events_config[key] else Qt.Unchecked
+        elif _type == "camera":
+            checked = Qt.Checked if self.app_config.camera_config[key] else Qt.Unchecked
         _checkbox.setCheckState(checked)
         if description:
             _checkbox.setToolTip(description)
@@ -236,33 +280,71 @@ class MainWindow(QMainWindow):
     def checkbox_state_changed(self, key, value, type):
         new_value = not not value
         if type == "mp":
-            self.cv2_thread.mp_config[key] = new_value
+            self.cv2_thread.pipeline.mp_config[key] = new_value
             self.app_config.mp_config[key] = new_value
         elif type == "body":
-            self.cv2_thread.body[key] = new_value
+            self.cv2_thread.pipeline.body[key] = new_value
             self.app_config.body_config[key] = new_value
         elif type == "events":
-            self.cv2_thread.body.events[key] = new_value
+            self.cv2_thread.pipeline.body.events[key] = new_value
             self.app_config.events_config[key] = new_value
+        elif type == "camera":
+            self.cv2_thread.pipeline.camera_config[key] = new_value
+            self.app_config.camera_config[key] = new_value
 
         self.app_config.save_config()
 
     def add_controls_camera_ports(self, layout: QBoxLayout):
         controls_row = QFormLayout()
 
-        controls_combobox = QComboBox()
-        controls_combobox.setFixedWidth(100)
-        controls_combobox.addItems(list(map(str, self.camera_ports)))
-        controls_combobox.currentIndexChanged.connect(self.camera_ports_combobox_change)
+        self.camera_ports_combobox = QComboBox()
+        self.camera_ports_combobox.setFixedWidth(100)
+        self.camera_ports_combobox.addItems(list(map(str, self.camera_ports)))
+        self.camera_ports_combobox.currentIndexChanged.connect(
+            self.camera_ports_combobox_change
+        )
 
-        controls_row.addRow("Select camera: ", controls_combobox)
+        controls_row.addRow("Select camera: ", self.camera_ports_combobox)
         layout.addLayout(controls_row)
 
-    def camera_ports_combobox_change(self, index: int):
-        self.cv2_thread.camera_port = self.camera_ports[index]
+    def camera_port_checked_changed(self, port: int, working: bool):
+        # the selected port may be busy because the camera is running
+        if working == (port in self.camera_ports) or (
+            not working
+            and port == self.cv2_thread.pipeline.camera_port
+            and self.cv2_thread.pipeline.status
+        ):
+            return
+
+        # update the items without changing the selected camera
+        combobox = self.camera_ports_combobox
+        combobox.blockSignals(True)
+        if working:
+            self.camera_ports.append(port)
+            self.camera_ports.sort()
+            combobox.insertItem(self.camera_ports.index(port), str(port))
+        else:
+            combobox.removeItem(self.camera_ports.index(port))
+            self.camera_ports.remove(port)
+        if self.cv2_thread.pipeline.camera_port in self.camera_ports:
+            combobox.setCurrentIndex(
+                self.camera_ports.index(self.cv2_thread.pipeline.camera_port)
+            )
+        combobox.blockSignals(False)
+
+        if combobox.currentIndex() >= 0:
+            self.cv2_thread.pipeline.camera_port = self.camera_ports[
+                combobox.currentIndex()
+            ]
+
+    def camera_ports_scanned_changed(self, working_ports: list):
+        # cache the ports for the next launch, including a running camera
+        self.app_config.camera_config["camera_ports"] = list(self.camera_ports)
+        self.app_config.save_config()
 
-        if self.cv2_thread.status:
-            self.cv2_thread.toggle()
+    # a running camera is switched without stopping the pipeline
+    def camera_ports_combobox_change(self, index: int):
+        self.cv2_thread.pipeline.camera_port = self.camera_ports[index]
 
     def add_controls_mode_combobox(self, layout: QBoxLayout):
         controls_row = QFormLayout()
@@ -278,10 +360,10 @@ class MainWindow(QMainWindow):
         layout.addLayout(controls_row)
 
     def controls_mode_combobox_change(self, index: int):
-        self.cv2_thread.body.mode = body_modes[index]
+        self.cv2_thread.pipeline.body.mode = body_modes[index]
 
     def event_config_window_saved(self, new_events_config: dict):
         for k, v in new_events_config.items():
-            self.cv2_thread.body.events[k] = v
+            self.cv2_thread.pipeline.body.events[k] = v
             self.app_config.events_config[k] = v
         self.app_config.save_config()